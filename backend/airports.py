@@ -0,0 +1,302 @@
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+AIRPORTS_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airportCodes.json')
+)
+
+_TOKEN_RE = re.compile(r"[^A-Z0-9]+")
+
+# IATA metropolitan area codes (or the main airport where there is none)
+# and their airports, main airport first. The dataset only has city names,
+# which miss airports named after a neighbouring town (EWR, LTN, BUR) and
+# merge different cities that share a name (Portland OR/ME), so the major
+# metro areas are listed explicitly; other cities fall back to the dataset.
+METRO_AREAS = {
+    "BJS": ("PEK", "PKX"),
+    "BKK": ("BKK", "DMK"),
+    "BUE": ("EZE", "AEP"),
+    "CHI": ("ORD", "MDW"),
+    "DFW": ("DFW", "DAL"),
+    "DTT": ("DTW",),
+    "DXB": ("DXB", "DWC"),
+    "HOU": ("IAH", "HOU"),
+    "IST": ("IST", "SAW"),
+    "JKT": ("CGK", "HLP"),
+    "LAX": ("LAX", "BUR", "LGB", "SNA", "ONT"),
+    "LON": ("LHR", "LGW", "STN", "LTN", "LCY", "SEN"),
+    "MIA": ("MIA", "FLL", "PBI"),
+    "MIL": ("MXP", "LIN", "BGY"),
+    "MOW": ("SVO", "DME", "VKO"),
+    "NYC": ("JFK", "EWR", "LGA"),
+    "OSA": ("KIX", "ITM"),
+    "PAR": ("CDG", "ORY"),
+    "RIO": ("GIG", "SDU"),
+    "ROM": ("FCO", "CIA"),
+    "SAO": ("GRU", "CGH", "VCP"),
+    "SEL": ("ICN", "GMP"),
+    "SFO": ("SFO", "OAK", "SJC"),
+    "SHA": ("PVG", "SHA"),
+    "STO": ("ARN", "BMA"),
+    "TYO": ("HND", "NRT"),
+    "WAS": ("IAD", "DCA", "BWI"),
+    "YMQ": ("YUL",),
+    "YTO": ("YYZ", "YTZ"),
+}
+
+# Airports the dataset fallback must not group by city: different cities
+# sharing a name (Portland OR/ME, Rochester NY/MN) and fields without
+# regular scheduled service
+DATASET_METRO_EXCLUDED = frozenset({
+    "ADJ", "BFI", "DIA", "NTR", "OSF", "PDX", "PWM", "ROC", "RST", "SFH", "VGT", "YMX",
+})
+
+
+def _tokens(text):
+    return [t for t in _TOKEN_RE.split(text.upper()) if t]
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _PrefixIndex:
+    """Sorted token list with posting sets, for token-prefix lookups"""
+
+    def __init__(self, postings):
+        self._postings = dict(postings)
+        self._tokens = sorted(self._postings)
+
+    def prefix(self, prefix):
+        """Return the set of ranks having a token that starts with prefix"""
+        ranks = set()
+        i = bisect_left(self._tokens, prefix)
+        while i < len(self._tokens) and self._tokens[i].startswith(prefix):
+            ranks.update(self._postings[self._tokens[i]])
+            i += 1
+        return ranks
+
+
+class AirportIndex:
+    """
+    In-memory airport lookup built once from airportCodes.json
+
+    Airports are ranked by code; a rank is the position in that sorted list.
+    Matches are returned in tiers: exact code, code prefix, city word prefix,
+    city/name word prefix and finally any substring of "city name" (found
+    through a trigram index). Within a tier results are ordered by code.
+    """
+
+    def __init__(self, airports):
+        self.airports = airports
+        self._sorted = sorted(airports, key=lambda a: a["code"])
+        self._codes = [a["code"].upper() for a in self._sorted]
+        self._texts = [f"{a['city']} {a['name']}".upper() for a in self._sorted]
+
+        city_postings = defaultdict(set)
+        word_postings = defaultdict(set)
+        trigram_postings = defaultdict(set)
+        for rank, airport in enumerate(self._sorted):
+            for token in _tokens(airport["city"]):
+                city_postings[token].add(rank)
+                word_postings[token].add(rank)
+            for token in _tokens(airport["name"]):
+                word_postings[token].add(rank)
+            for gram in _trigrams(self._texts[rank]):
+                trigram_postings[gram].add(rank)
+
+        self._city = _PrefixIndex(city_postings)
+        self._words = _PrefixIndex(word_postings)
+        self._trigrams = dict(trigram_postings)
+
+        # Metro area and member airport code -> member codes in the dataset
+        self._by_code = {a["code"].upper(): a for a in airports}
+        self._metros = {}
+        for metro, codes in METRO_AREAS.items():
+            members = tuple(code for code in codes if code in self._by_code)
+            self._metros[metro] = members
+            for code in members:
+                self._metros.setdefault(code, members)
+
+        # Other cities: international airports sharing a city and country
+        # (the name is the dataset's only hint of scheduled service)
+        by_city = defaultdict(list)
+        for airport in self._sorted:
+            code = airport["code"].upper()
+            if (airport["city"] and code not in self._metros and code not in DATASET_METRO_EXCLUDED
+                    and "INTERNATIONAL" in airport["name"].upper()):
+                by_city[(airport["city"], airport["country"])].append(code)
+        for codes in by_city.values():
+            if len(codes) > 1:
+                for code in codes:
+                    self._metros[code] = tuple(codes)
+
+    @classmethod
+    def from_file(cls, path=AIRPORTS_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.airports)
+
+    def __contains__(self, code):
+        # Airport or metro area code
+        return code in self._by_code or code in self._metros
+
+    def get(self, code):
+        """Return the airport dict for an IATA code, or None"""
+        return self._by_code.get(code)
+
+    def metro_airports(self, code, limit=None):
+        """
+        Return the codes of airports serving the same city as code
+
+        Metro area codes (NYC) and their member airports (JFK) resolve
+        through METRO_AREAS, keeping only airports in the dataset; other
+        airports resolve to the international airports of their city in the
+        dataset (MCO -> MCO/SFB). The given airport comes first. Any other
+        code resolves to just itself.
+
+        Args:
+            code: IATA airport or metro area code
+            limit: Maximum number of codes returned
+        """
+        code = code.upper()
+        group = self._metros.get(code)
+        if not group:
+            return [code]
+        codes = [code] if code in group else []
+        codes.extend(c for c in group if c != code)
+        return codes[:limit] if limit else codes
+
+    def search(self, query, limit=8):
+        """
+        Return up to `limit` airports matching query, best matches first
+
+        Args:
+            query: Airport code, city or name fragment (case-insensitive)
+            limit: Maximum number of results
+
+        Returns:
+            List of airport dicts (code, name, city, country)
+        """
+        q = query.strip().upper()
+        if not q or limit <= 0:
+            return []
+
+        ranks = []
+        seen = set()
+
+        def take(candidates):
+            candidates = candidates - seen
+            best = heapq.nsmallest(limit - len(ranks), candidates)
+            ranks.extend(best)
+            seen.update(best)
+            return len(ranks) >= limit
+
+        # Exact code, then code prefix (a contiguous range in sorted codes)
+        start = bisect_left(self._codes, q)
+        end = start
+        while end < len(self._codes) and end - start < limit and self._codes[end].startswith(q):
+            end += 1
+        if take(set(range(start, end))):
+            return self._result(ranks)
+
+        tokens = _tokens(q)
+        if tokens:
+            if take(self._all_prefixes(self._city, tokens)):
+                return self._result(ranks)
+            if take(self._all_prefixes(self._words, tokens)):
+                return self._result(ranks)
+
+        if len(q) >= 3:
+            take(self._substring(q))
+        return self._result(ranks)
+
+    def _all_prefixes(self, index, tokens):
+        matched = None
+        for token in tokens:
+            ranks = index.prefix(token)
+            matched = ranks if matched is None else matched & ranks
+            if not matched:
+                return set()
+        return matched
+
+    def _substring(self, q):
+        postings = []
+        for gram in _trigrams(q):
+            ranks = self._trigrams.get(gram)
+            if not ranks:
+                return set()
+            postings.append(ranks)
+        postings.sort(key=len)
+        candidates = set.intersection(*postings)
+        return {rank for rank in candidates if q in self._texts[rank]}
+
+    def _result(self, ranks):
+        return [self._sorted[rank] for rank in ranks]
+
+
+AIRPORT_COLUMNS = ("code", "name", "city", "country")
+
+
+class EncodedPayload:
+    """A response body prepared once in every content encoding we serve"""
+
+    def __init__(self, body, tag):
+        self.etag = hashlib.sha256(body).hexdigest()[:20] + "-" + tag
+        self.bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=11)
+
+    def select(self, accept_encodings):
+        """
+        Return (encoding, body, etag) for the smallest acceptable encoding
+
+        Args:
+            accept_encodings: Werkzeug Accept object for the Accept-Encoding header
+        """
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and accept_encodings[encoding]:
+                return encoding, self.bodies[encoding], f"{self.etag}-{encoding}"
+        return "identity", self.bodies["identity"], self.etag
+
+    def etags(self):
+        return [self.etag] + [f"{self.etag}-{encoding}" for encoding in self.bodies if encoding != "identity"]
+
+
+def build_airport_payloads(airports):
+    """
+    Build the minified airport list in each format served by /api/airports
+
+    Returns:
+        Dict of format name -> EncodedPayload. 'records' is the list of
+        airport objects; 'columns' holds parallel code/name/city/country
+        arrays, avoiding the repeated keys.
+    """
+    columns = {name: [airport[name] for airport in airports] for name in AIRPORT_COLUMNS}
+    formats = {"records": airports, "columns": columns}
+    return {
+        name: EncodedPayload(
+            json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            name,
+        )
+        for name, value in formats.items()
+    }
+
+
+def load_airport_index(path=AIRPORTS_PATH):
+    """Load airportCodes.json and build the search index"""
+    return AirportIndex.from_file(path)
@@ -1,6 +1,37 @@
+import copy
 import os
-from flask import Flask, jsonify, render_template, send_from_directory, request
-from backend.flight_api import search_flights
+import time
+import uuid
+import logging
+import threading
+from flask import Flask, Response, g, jsonify, render_template, send_from_directory, request
+from werkzeug.exceptions import HTTPException
+from backend.airports import build_airport_payloads
+from backend.flight_api import get_provider
+from backend.providers import ProviderError, UpstreamUnavailable
+from backend.metrics import REQUEST_LATENCY, RESPONSE_SIZE, registry, stage
+from backend.pairing import parse_pairing_options, rank_pairs
+from backend.results import apply_result_query, parse_result_query
+from backend.serialization import encode_compact, encode_event, json_response, parse_fields, project
+from backend.request_log import CACHE_WARMUP_FETCH, CACHE_WARMUP_LOG, create_request_log, warm_cache
+from backend.search import (
+	BATCH_MAX_SEARCHES,
+	METRO_MAX_AIRPORTS,
+	cached_search_flights,
+	flight_cache,
+	get_airport_index,
+	get_refresher,
+	get_result_store,
+	iter_searches,
+	negative_cache,
+	normalize_date_grid_params,
+	normalize_search_params,
+	normalize_stream_searches,
+	search_batch,
+	search_date_grid,
+	search_metro,
+	search_roundtrip,
+)
 
 #Set templates directory relative to this file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,6 +42,119 @@ app = Flask(__name__,
 	static_folder='../frontend/static'
 )
 
+logger = logging.getLogger(__name__)
+
+# Shared state built by warm_up(): the encoded airport payloads and the
+# optional append-only log of searches (REQUEST_LOG_PATH). The airport
+# index, result store and refresher live in backend.search and are built
+# there on first use unless warm_up() has built them already
+airport_payloads = None
+request_log = None
+
+# _warm_up_lock guards warm_up_status; _warm_up_running is held while
+# warm_up() runs, so /health can report progress in the meantime
+warm_up_status = {'ready': False, 'seconds': None, 'steps': {}}
+_warm_up_lock = threading.Lock()
+_warm_up_running = threading.Lock()
+
+
+def warm_up():
+	"""
+	Build the state shared by all requests, once
+	Loads the airport index and encodes the airport payloads, opens the
+	result store and request log, starts the background
+	refresher, creates the flight provider with its connection pool,
+	compiles the page template and pre-warms the flight cache from
+	CACHE_WARMUP_LOG. Per-step timings are reported by /health
+	"""
+	global airport_payloads, request_log
+	with _warm_up_running:
+		if warm_up_status['ready']:
+			return
+		started = time.perf_counter()
+		
+		def step(name, build):
+			step_started = time.perf_counter()
+			result = build()
+			with _warm_up_lock:
+				warm_up_status['steps'][name] = round((time.perf_counter() - step_started) * 1000, 1)
+			return result
+		
+		index = step('airport_index', get_airport_index)
+		airport_payloads = step('airport_payloads', lambda: build_airport_payloads(index.airports))
+		step('result_store', get_result_store)
+		request_log = step('request_log', create_request_log)
+		step('refresher', get_refresher)
+		step('provider', get_provider)
+		step('templates', lambda: app.jinja_env.get_template('index.html'))
+		if CACHE_WARMUP_LOG and os.path.exists(CACHE_WARMUP_LOG):
+			loaded = step('cache', lambda: warm_cache(CACHE_WARMUP_LOG, CACHE_WARMUP_FETCH))
+			logger.info("Warmed %d cached searches from %s", loaded, CACHE_WARMUP_LOG)
+		
+		with _warm_up_lock:
+			warm_up_status['seconds'] = round(time.perf_counter() - started, 3)
+			warm_up_status['ready'] = True
+
+
+def start_warm_up():
+	"""Run warm_up() in a background thread unless it has finished or is already running"""
+	if not warm_up_status['ready'] and not _warm_up_running.locked():
+		threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+def create_app():
+	"""
+	Application factory for production servers
+	Runs warm_up() so no request pays for building shared state; importing
+	this module builds nothing. With a pre-forking server call it in the
+	master process (gunicorn --preload wsgi:app) so the work is done once
+	for all workers; threads and connection pools are rebuilt in each
+	worker after the fork
+	"""
+	warm_up()
+	return app
+
+registry.callback(
+	"flight_cache_requests_total",
+	"Flight cache lookups by result",
+	lambda: {key: flight_cache.stats()[key] for key in ('hits', 'misses', 'coalesced')},
+	kind="counter",
+	labelname="result",
+)
+registry.callback(
+	"flight_cache_entries",
+	"Searches currently held in the flight cache",
+	lambda: flight_cache.stats()['entries'],
+)
+
+
+@app.before_request
+def start_request():
+	g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+	g.request_start = time.perf_counter()
+	# Without create_app() the first request builds the shared state. Health
+	# checks and metrics start it in the background and report on it, so a
+	# readiness probe alone brings the worker up
+	if not warm_up_status['ready']:
+		if request.endpoint in ('health', 'metrics'):
+			start_warm_up()
+		else:
+			warm_up()
+
+
+@app.after_request
+def finish_request(response):
+	endpoint = request.endpoint or 'unknown'
+	REQUEST_LATENCY.observe(
+		time.perf_counter() - g.request_start,
+		endpoint=endpoint,
+		status=response.status_code
+	)
+	if response.content_length is not None:
+		RESPONSE_SIZE.observe(response.content_length, endpoint=endpoint)
+	response.headers['X-Request-ID'] = g.request_id
+	return response
+
 
 @app.route('/')
 def index():
@@ -19,63 +163,395 @@ def index():
 
 @app.route('/health')
 def health():
-	return jsonify(status='ok', message='Backend reachable')
+	"""
+	Liveness and readiness check
+	Returns 503 until the shared state has been built, along with warm-up
+	timings and the upstream circuit breaker state
+	"""
+	# A consistent snapshot, as warm_up() updates the status step by step
+	with _warm_up_lock:
+		status = copy.deepcopy(warm_up_status)
+	ready = status['ready']
+	breaker = getattr(get_provider(), 'breaker', None) if ready else None
+	return jsonify(
+		status='ok' if ready else 'starting',
+		message='Backend reachable',
+		ready=ready,
+		warm_up=status,
+		upstream_circuit=breaker.state if breaker is not None else None
+	), 200 if ready else 503
+
+
+def _parse_result_options(data):
+	"""Parse the sort/filter/pagination, 'fields' and 'format' options of a search payload"""
+	query = parse_result_query(data)
+	projection = parse_fields(data.get('fields'))
+	response_format = data.get('format', 'full')
+	if response_format not in ('full', 'compact'):
+		raise ValueError("format must be 'full' or 'compact'")
+	return query, projection, response_format
+
+
+def _flights_payload(page, total, next_cursor, projection, response_format):
+	"""Build the /search-flights response body for one page of results"""
+	payload = {
+		'success': True,
+		'count': len(page),
+		'total': total,
+		'next_cursor': next_cursor
+	}
+	page = project(page, projection)
+	if response_format == 'compact':
+		payload['format'] = 'compact'
+		payload.update(encode_compact(page))
+	else:
+		payload['flights'] = page
+	return payload
+
+
+def _metro_airports(params, any_airport):
+	"""Return the (origins, destinations) airport codes to search for an any_airport option"""
+	if any_airport in (None, False, '', 'none'):
+		sides = ()
+	elif any_airport in (True, 'both'):
+		sides = ('departure', 'arrival')
+	elif any_airport in ('departure', 'arrival'):
+		sides = (any_airport,)
+	else:
+		raise ValueError("any_airport must be true, 'departure', 'arrival' or 'both'")
+	
+	def expand(side):
+		code = params[f'{side}_id']
+		if side not in sides:
+			return [code]
+		return get_airport_index().metro_airports(code, limit=METRO_MAX_AIRPORTS)
+	
+	return expand('departure'), expand('arrival')
+
+
+def _record_search(params):
+	"""Count one search towards the popularity the background refresher ranks by"""
+	refresher = get_refresher()
+	if refresher is not None:
+		refresher.record(params)
+
+
+def _record_route(params, result):
+	"""Count one route of a metro area search for refreshing and log its result"""
+	_record_search(params)
+	if result.ok and request_log is not None:
+		request_log.log(params, result.value)
+
+
+def _error_status(error):
+	"""Map a search error to its HTTP status and client-facing message"""
+	if isinstance(error, HTTPException):
+		# e.g. a malformed JSON body or the wrong content type
+		return error.code, error.description
+	if isinstance(error, ValueError):
+		return 400, str(error)
+	if isinstance(error, UpstreamUnavailable):
+		return 503, str(error)
+	if isinstance(error, ProviderError):
+		return 502, f'Flight search failed upstream: {str(error)}'
+	if isinstance(error, TimeoutError):
+		return 504, str(error)
+	return 500, f'An error occurred: {str(error)}'
+
+
+def _error_response(error):
+	"""Return the JSON error response for a failed request, logging server-side failures"""
+	status, message = _error_status(error)
+	if status >= 500:
+		logger.warning("[%s] %s failed: %s", g.request_id, request.endpoint, error)
+	headers = {'Retry-After': '5'} if status == 503 else {}
+	return jsonify({'error': message}), status, headers
 
 
 @app.route('/search-flights', methods=['POST'])
 def search_flights_endpoint():
 	"""
 	Endpoint to search for flights using SerpAPI
-	Expects JSON payload with flight search parameters
+	Expects JSON payload with flight search parameters, plus optional sort,
+	filter (max_stops, max_price, airlines, departure_after/before) and
+	limit/cursor pagination options applied to the cached results, a
+	'fields' projection and format='compact' for dictionary-encoded output.
+	any_airport ('departure', 'arrival' or true for both) also searches the
+	other airports of the same metro area (e.g. NYC or JFK -> JFK/EWR/LGA)
+	and merges the results
+	"""
+	try:
+		with stage('validate'):
+			data = request.get_json()
+			params = normalize_search_params(data)
+			query, projection, response_format = _parse_result_options(data)
+			origins, destinations = _metro_airports(params, data.get('any_airport'))
+		
+		logger.debug(
+			"[%s] Searching flights: %s -> %s on %s (return %s, adults %s, class %s, type %s)",
+			g.request_id, params['departure_id'], params['arrival_id'], params['outbound_date'],
+			params['return_date'], params['adults'], params['travel_class'], params['flight_type']
+		)
+		
+		routes = None
+		if len(origins) * len(destinations) > 1:
+			# Each airport pair is cached, refreshed and logged as its own search
+			with stage('search'):
+				flights, routes = search_metro(params, origins, destinations, on_route=_record_route)
+		else:
+			# Popular searches are kept fresh in the background
+			_record_search(params)
+			
+			# Search for flights (served from the result cache when possible)
+			with stage('search'):
+				flights = cached_search_flights(params)
+			
+			if request_log is not None:
+				request_log.log(params, flights)
+		
+		# Sorting, filtering and paging run over the cached result set
+		with stage('query'):
+			page, total, next_cursor = apply_result_query(flights, query)
+		
+		with stage('serialize'):
+			payload = _flights_payload(page, total, next_cursor, projection, response_format)
+			if routes is not None:
+				payload['routes'] = routes
+			return json_response(payload)
+	
+	except Exception as e:
+		return _error_response(e)
+
+
+@app.route('/search-flights/stream', methods=['POST'])
+def search_flights_stream_endpoint():
+	"""
+	Endpoint streaming flights as each search completes
+	Accepts the /search-flights payload (with split_legs to search both
+	directions of a round trip) or the /search-flights/dates payload, plus
+	the filter/sort and 'fields' options. Responds with newline-delimited
+	JSON, or Server-Sent Events if the client accepts text/event-stream.
+	Every record has a 'type': 'search' (label and counts) followed by its
+	'flight' records, 'error' for a failed search, and 'done' at the end
+	"""
+	try:
+		data = request.get_json()
+		searches, calendar = normalize_stream_searches(data)
+		query = parse_result_query(data)
+		if query['offset']:
+			raise ValueError("cursor is not supported when streaming")
+		projection = parse_fields(data.get('fields'))
+	except Exception as e:
+		return _error_response(e)
+	
+	sse = request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+	request_id = g.request_id
+	
+	# Streamed searches count towards popularity like /search-flights ones
+	for _, params in searches:
+		_record_search(params)
+	
+	def generate():
+		# One chunk per completed search, so only that search's flights are
+		# held while it is written
+		count = 0
+		for label, params, result in iter_searches(searches, calendar):
+			if not result.ok:
+				logger.warning("[%s] Streamed search %s failed: %s", request_id, label, result.error)
+				yield encode_event('error', {'search': label, 'error': str(result.error)}, sse)
+				continue
+			if request_log is not None:
+				request_log.log(params, result.value)
+			page, total, _ = apply_result_query(result.value, query)
+			header = {'search': label, 'params': params, 'count': len(page), 'total': total}
+			yield encode_event('search', header, sse) + b''.join(
+				encode_event('flight', {'search': label, 'flight': flight}, sse)
+				for flight in project(page, projection)
+			)
+			count += len(page)
+		yield encode_event('done', {'count': count, 'searches': len(searches)}, sse)
+	
+	return Response(
+		generate(),
+		mimetype='text/event-stream' if sse else 'application/x-ndjson',
+		headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+	)
+
+
+@app.route('/search-flights/batch', methods=['POST'])
+def search_flights_batch_endpoint():
+	"""
+	Endpoint running several searches in one request
+	Expects {"searches": [...]} where each item is a /search-flights payload
+	(including its own sort/filter/pagination, fields and format options).
+	Identical searches are run once and the distinct ones run concurrently.
+	Results come back in request order; an item that fails carries its own
+	'error' and 'status' instead of failing the whole batch. Metro area
+	searches (any_airport) are not supported in a batch
+	"""
+	try:
+		data = request.get_json()
+		specs = data.get('searches') if isinstance(data, dict) else None
+		if not isinstance(specs, list) or not specs:
+			raise ValueError("searches must be a non-empty list")
+		if len(specs) > BATCH_MAX_SEARCHES:
+			raise ValueError(f"Too many searches: {len(specs)} (max {BATCH_MAX_SEARCHES})")
+	except Exception as e:
+		return _error_response(e)
+	
+	# Validate everything up front; only valid items are searched, and an
+	# item that cannot be parsed fails on its own
+	items = []
+	for spec in specs:
+		try:
+			if isinstance(spec, dict) and spec.get('any_airport'):
+				raise ValueError("any_airport is not supported in batch searches")
+			items.append((normalize_search_params(spec), _parse_result_options(spec), None))
+		except Exception as e:
+			items.append((None, None, e))
+	
+	valid = [params for params, _, error in items if error is None]
+	for params in valid:
+		_record_search(params)
+	outcomes, distinct = search_batch(valid) if valid else ([], 0)
+	outcomes = iter(outcomes)
+	
+	results = []
+	for params, options, error in items:
+		if error is None:
+			outcome = next(outcomes)
+			if outcome.ok:
+				if request_log is not None:
+					request_log.log(params, outcome.value)
+				query, projection, response_format = options
+				page, total, next_cursor = apply_result_query(outcome.value, query)
+				results.append(_flights_payload(page, total, next_cursor, projection, response_format))
+				continue
+			error = outcome.error
+		status, message = _error_status(error)
+		if status >= 500:
+			logger.warning("[%s] Batch search failed: %s", g.request_id, error)
+		results.append({'success': False, 'status': status, 'error': message})
+	
+	return json_response({
+		'success': True,
+		'count': len(results),
+		'searches': distinct,
+		'results': results
+	})
+
+
+@app.route('/search-roundtrip', methods=['POST'])
+def search_roundtrip_endpoint():
+	"""
+	Endpoint to search outbound and return flights in parallel
+	Expects the /search-flights payload with a return_date
 	"""
 	try:
 		data = request.get_json()
 		
-		print("=" * 50)
-		print("Received flight search request:")
-		print(f"Request data: {data}")
-		print("=" * 50)
+		# Both legs are one-way searches; return_date picks the return leg
+		params = normalize_search_params(dict(data or {}, type=1))
+		results = search_roundtrip(params)
 		
-		# Validate required fields
-		required_fields = ['departure_id', 'arrival_id', 'outbound_date']
-		for field in required_fields:
-			if not data.get(field):
-				return jsonify({'error': f'Missing required field: {field}'}), 400
+		return jsonify({
+			'success': True,
+			'outbound': results['outbound'],
+			'return': results['return'],
+			'count': {
+				'outbound': len(results['outbound']),
+				'return': len(results['return'])
+			}
+		})
+	
+	except Exception as e:
+		return _error_response(e)
+
+
+@app.route('/search-roundtrip/pairs', methods=['POST'])
+def search_roundtrip_pairs_endpoint():
+	"""
+	Endpoint ranking outbound/return combinations of a round trip
+	Expects either the /search-roundtrip payload (both legs are searched) or
+	'outbound' and 'return' flight lists, plus optional weights (price,
+	duration, stops, emissions), min_stay_hours, max_stay_hours,
+	max_total_price, max_total_stops and limit
+	"""
+	try:
+		data = request.get_json()
+		if not isinstance(data, dict):
+			raise ValueError("Request body must be a JSON object")
+		options = parse_pairing_options(data)
 		
-		# Extract parameters
-		departure_id = data.get('departure_id')
-		arrival_id = data.get('arrival_id')
-		outbound_date = data.get('outbound_date')
-		return_date = data.get('return_date')
-		adults = int(data.get('adults', 1))
-		travel_class = int(data.get('travel_class', 1))
-		flight_type = int(data.get('type', 1))
+		if data.get('outbound') is not None or data.get('return') is not None:
+			outbound, inbound = data.get('outbound'), data.get('return')
+			for flights in (outbound, inbound):
+				if not isinstance(flights, list) or not all(isinstance(f, dict) for f in flights):
+					raise ValueError("outbound and return must both be lists of flights")
+		else:
+			results = search_roundtrip(normalize_search_params(dict(data, type=1)))
+			outbound, inbound = results['outbound'], results['return']
 		
-		print(f"Searching flights: {departure_id} -> {arrival_id}")
-		print(f"Dates: {outbound_date} to {return_date}")
-		print(f"Adults: {adults}, Class: {travel_class}, Type: {flight_type}")
+		pairs = rank_pairs(outbound, inbound, options)
+		for pair in pairs:
+			pair['outbound'] = outbound[pair['outbound_index']]
+			pair['return'] = inbound[pair['return_index']]
 		
-		# Search for flights
-		flights = search_flights(
-			departure_id=departure_id,
-			arrival_id=arrival_id,
-			outbound_date=outbound_date,
-			return_date=return_date,
-			adults=adults,
-			travel_class=travel_class,
-			flight_type=flight_type
-		)
+		return json_response({
+			'success': True,
+			'count': len(pairs),
+			'pairs': pairs
+		})
+	
+	except Exception as e:
+		return _error_response(e)
+
+
+@app.route('/search-flights/dates', methods=['POST'])
+def search_flight_dates_endpoint():
+	"""
+	Endpoint to search a range of dates and build a price calendar
+	Expects outbound_date_from/outbound_date_to instead of outbound_date,
+	plus optional return_date, return_flex_days and include_flights
+	"""
+	try:
+		data = request.get_json()
+		
+		base, grid = normalize_date_grid_params(data)
+		calendar = search_date_grid(base, grid, include_flights=bool(data.get('include_flights')))
+		
+		priced = [entry for entry in calendar if entry.get('cheapest_price') is not None]
+		cheapest = None
+		if priced:
+			best = min(priced, key=lambda entry: entry['cheapest_price'])
+			cheapest = {key: best[key] for key in ('outbound_date', 'return_date', 'cheapest_price')}
 		
 		return jsonify({
 			'success': True,
-			'flights': flights,
-			'count': len(flights)
+			'calendar': calendar,
+			'cheapest': cheapest,
+			'count': len(calendar)
 		})
 	
-	except ValueError as ve:
-		return jsonify({'error': str(ve)}), 400
 	except Exception as e:
-		return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+		return _error_response(e)
+
+
+@app.route('/api/cache/stats')
+def cache_stats():
+	"""Return flight result cache hit/miss/coalesced counters, negative cache and background refresher state"""
+	stats = flight_cache.stats()
+	stats['negative'] = negative_cache.stats()
+	refresher = get_refresher()
+	if refresher is not None:
+		stats['refresher'] = refresher.stats()
+	return jsonify(stats)
+
+
+@app.route('/metrics')
+def metrics():
+	"""Return request, search stage and upstream metrics in Prometheus text format"""
+	return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/images/<path:filename>')
@@ -85,15 +561,36 @@ def images(filename):
 
 @app.route('/api/airports')
 def get_airports():
-	"""Return airport codes for autocomplete"""
-	import json
-	with open('airportCodes.json', 'r', encoding='utf-8') as f:
-		airports = json.load(f)
-	return jsonify(airports)
-
+	"""
+	Return the full airport list
+	?format=columns returns parallel code/name/city/country arrays instead
+	of one object per airport. Bodies are precompressed and carry an ETag.
+	"""
+	payload = airport_payloads.get(request.args.get('format', 'records'))
+	if payload is None:
+		return jsonify({'error': 'format must be one of: ' + ', '.join(airport_payloads)}), 400
+	
+	encoding, body, etag = payload.select(request.accept_encodings)
+	if any(request.if_none_match.contains(tag) for tag in payload.etags()):
+		response = Response(status=304)
+	else:
+		response = Response(body, mimetype='application/json')
+		if encoding != 'identity':
+			response.headers['Content-Encoding'] = encoding
+	
+	response.set_etag(etag)
+	response.headers['Cache-Control'] = 'public, max-age=86400'
+	response.headers['Vary'] = 'Accept-Encoding'
+	return response
 
-if __name__ == "__main__":
-    app.run(debug=True)
 
+@app.route('/api/airports/search')
+def search_airports():
+	"""Return ranked airport matches for autocomplete"""
+	query = request.args.get('q', '')
+	limit = min(request.args.get('limit', 8, type=int), 50)
+	return jsonify(get_airport_index().search(query, limit))
 
 
+if __name__ == "__main__":
+    create_app().run(debug=os.getenv("FLASK_DEBUG", "0") == "1")
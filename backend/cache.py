@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _PendingCall:
+    """A single in-flight load that concurrent callers can wait on"""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class FlightCache:
+    """
+    Thread-safe TTL + LRU cache with single-flight loading
+
+    Entries expire `ttl` seconds after they are stored and the least recently
+    used entry is evicted once `max_entries` is reached. When several threads
+    miss on the same key at once only the first one runs the loader; the
+    others wait for its result (counted as `coalesced`).
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_stale(self, key):
+        """Return the value for key even if it has expired, or None if evicted"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def peek(self, key):
+        """
+        Return (value, seconds until expiry) for key, or None if not stored
+
+        Expired entries are returned with a negative expiry. Neither the LRU
+        order nor the hit counters are touched.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[1], entry[0] - time.monotonic()
+
+    def set(self, key, value, ttl=None):
+        """Store value for key, expiring after ttl seconds (default: the cache ttl)"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_load(self, key, loader, with_ttl=False):
+        """
+        Return the cached value for key, calling loader() on a miss
+
+        Exceptions raised by the loader are propagated to every waiting
+        caller and nothing is cached. With with_ttl, loader() returns
+        (value, ttl) and the value is cached for ttl seconds (None for the
+        cache ttl).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            call = self._pending.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _PendingCall()
+                self._pending[key] = call
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            return call.wait()
+
+        ttl = None
+        try:
+            value = loader()
+            if with_ttl:
+                value, ttl = value
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                del self._pending[key]
+            call.event.set()
+            raise
+
+        call.value = value
+        with self._lock:
+            self._store(key, value, ttl)
+            del self._pending[key]
+        call.event.set()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+    def _store(self, key, value, ttl=None):
+        # Caller must hold self._lock
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
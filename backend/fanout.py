@@ -0,0 +1,100 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "32"))
+
+_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def _reset_pool():
+    # Pool threads do not survive fork(); give each forked worker its own
+    global _pool
+    _pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+class FanOutResult:
+    """Outcome of one fanned-out call: either a value or an error"""
+
+    __slots__ = ("value", "error")
+
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def get(self):
+        """Return the value, re-raising the call's error if it failed"""
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def iter_fan_out(fn, items, max_concurrency=None, timeout=None):
+    """
+    Call fn(item) for every item concurrently, yielding results as they finish
+
+    Takes the same arguments as fan_out().
+
+    Yields:
+        (index, FanOutResult) tuples in completion order
+    """
+    items = list(items)
+    limit = max(1, min(max_concurrency or FANOUT_WORKERS, FANOUT_WORKERS))
+
+    pending = {}  # future -> (index, deadline)
+    next_index = 0
+    while next_index < len(items) or pending:
+        while next_index < len(items) and len(pending) < limit:
+            future = _pool.submit(fn, items[next_index])
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            pending[future] = (next_index, deadline)
+            next_index += 1
+
+        wait_for = None
+        if timeout is not None:
+            earliest = min(deadline for _, deadline in pending.values())
+            wait_for = max(0, earliest - time.monotonic())
+
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, _ = pending.pop(future)
+            error = future.exception()
+            yield index, FanOutResult(None if error else future.result(), error)
+
+        if timeout is not None:
+            now = time.monotonic()
+            for future, (index, deadline) in list(pending.items()):
+                if deadline <= now:
+                    del pending[future]
+                    yield index, FanOutResult(error=TimeoutError("Search timed out"))
+
+
+def fan_out(fn, items, max_concurrency=None, timeout=None):
+    """
+    Call fn(item) for every item concurrently on the shared fan-out pool
+
+    Args:
+        fn: Callable taking one item
+        items: Iterable of items
+        max_concurrency: Maximum calls from this fan-out running at once
+                         (default: the pool size)
+        timeout: Per-call deadline in seconds, measured from when the call
+                 is submitted; late calls are reported as TimeoutError and left to
+                 finish in the background
+
+    Returns:
+        List of FanOutResult in the same order as items
+    """
+    items = list(items)
+    results = [None] * len(items)
+    for index, result in iter_fan_out(fn, items, max_concurrency, timeout):
+        results[index] = result
+    return results
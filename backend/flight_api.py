@@ -1,28 +1,97 @@
-from serpapi import GoogleSearch
-from dotenv import load_dotenv
+from backend.metrics import UPSTREAM_LATENCY, UPSTREAM_PAYLOAD_FLIGHTS, stage
+from backend.providers import ProviderError, ReplayProvider, SerpApiProvider, UpstreamRejected, is_no_results
+from backend.resilience import ResilientProvider
+import threading
+import logging
+import time
 import os
 
-load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+SERPAPI_TIMEOUT = float(os.getenv("SERPAPI_TIMEOUT", "15"))
+SERPAPI_MAX_CONCURRENCY = int(os.getenv("SERPAPI_MAX_CONCURRENCY", "16"))
 
+# "serpapi" (default) or "replay" to serve recorded responses offline
+FLIGHT_PROVIDER = os.getenv("FLIGHT_PROVIDER", "serpapi")
 
-def search_flights(departure_id, arrival_id, outbound_date, return_date=None, adults=1, travel_class=1, flight_type=2):
+# Upstream protection applied around whichever provider is selected
+UPSTREAM_QPS = float(os.getenv("UPSTREAM_QPS", "10"))
+UPSTREAM_RATE_LIMIT_WAIT = float(os.getenv("UPSTREAM_RATE_LIMIT_WAIT", "2"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_HEDGE_AFTER = float(os.getenv("UPSTREAM_HEDGE_AFTER", "0")) or None
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+logger = logging.getLogger(__name__)
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def create_provider(name=FLIGHT_PROVIDER):
     """
-    Search for flights using SerpAPI Google Flights API
+    Create a flight provider by name
     
-    Args:
-        departure_id: Departure airport code (e.g., "JFK")
-        arrival_id: Arrival airport code (e.g., "LAX")
-        outbound_date: Departure date in YYYY-MM-DD format
-        return_date: Return date in YYYY-MM-DD format (optional, for round trips)
-        adults: Number of adult passengers (default: 1)
-        travel_class: Travel class (1=Economy, 2=Premium Economy, 3=Business, 4=First, default: 1)
-        flight_type: Trip type (1=Round-trip, 2=One-way, default: 1)
-    
-    Returns:
-        List of flight options with details
+    The replay provider reads REPLAY_RESPONSE_PATHS (os.pathsep-separated,
+    default response.json), REPLAY_LATENCY_MS and REPLAY_ERROR_RATE.
+    """
+    if name == "serpapi":
+        return SerpApiProvider(
+            GOOGLE_API_KEY,
+            max_concurrency=SERPAPI_MAX_CONCURRENCY,
+            timeout=SERPAPI_TIMEOUT,
+        )
+    if name == "replay":
+        kwargs = {}
+        if os.getenv("REPLAY_RESPONSE_PATHS"):
+            kwargs["paths"] = os.getenv("REPLAY_RESPONSE_PATHS").split(os.pathsep)
+        return ReplayProvider(
+            latency=float(os.getenv("REPLAY_LATENCY_MS", "0")) / 1000,
+            error_rate=float(os.getenv("REPLAY_ERROR_RATE", "0")),
+            **kwargs
+        )
+    raise ValueError(f"Unknown flight provider: {name}")
+
+
+def create_resilient_provider(name=FLIGHT_PROVIDER, **overrides):
     """
-    if not GOOGLE_API_KEY:
+    Create a provider wrapped with the configured rate limit, retries and circuit breaker
+
+    Keyword arguments override the ResilientProvider settings taken from the
+    environment (e.g. a separate qps budget for background work).
+    """
+    settings = {
+        "qps": UPSTREAM_QPS,
+        "rate_limit_wait": UPSTREAM_RATE_LIMIT_WAIT,
+        "retries": UPSTREAM_RETRIES,
+        "hedge_after": UPSTREAM_HEDGE_AFTER,
+        "failure_threshold": BREAKER_FAILURE_THRESHOLD,
+        "reset_timeout": BREAKER_RESET_TIMEOUT,
+        "max_workers": SERPAPI_MAX_CONCURRENCY,
+    }
+    settings.update(overrides)
+    return ResilientProvider(create_provider(name), **settings)
+
+
+def get_provider():
+    """Return the shared flight provider, creating it on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_resilient_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """Replace the shared flight provider (e.g. with a ReplayProvider)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def _build_params(provider, departure_id, arrival_id, outbound_date, return_date, adults, travel_class, flight_type):
+    """Build the SerpAPI Google Flights query parameters"""
+    if provider.requires_api_key and not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY not found in environment variables")
     
     params = {
@@ -34,98 +103,182 @@ def search_flights(departure_id, arrival_id, outbound_date, return_date=None, ad
         "travel_class": str(travel_class),
         "type": str(flight_type),
         "currency": "USD",
-        "hl": "en",
-        "api_key": GOOGLE_API_KEY
+        "hl": "en"
     }
     
     # Add return_date only if provided and it's a round trip
     if return_date and flight_type == 1:
         params["return_date"] = return_date
+
+    return params
+
+
+# Fixed output schema of a normalized flight option and of each of its legs
+FLIGHT_FIELDS = (
+    "price", "type", "airline", "airline_logo", "flight_number", "airplane",
+    "travel_class", "departure_airport", "arrival_airport", "duration",
+    "total_duration", "stops", "layovers", "carbon_emissions", "booking_token",
+    "extensions", "all_flights",
+)
+LEG_FIELDS = (
+    "departure_airport", "arrival_airport", "duration", "airline", "airline_logo",
+    "flight_number", "airplane", "travel_class", "extensions", "overnight",
+)
+
+# SerpAPI result groups, in display order
+_RESULT_GROUPS = ("best_flights", "other_flights")
+
+
+def _normalize_leg(leg):
+    get = leg.get
+    return {
+        "departure_airport": get("departure_airport"),
+        "arrival_airport": get("arrival_airport"),
+        "duration": get("duration"),
+        "airline": get("airline"),
+        "airline_logo": get("airline_logo"),
+        "flight_number": get("flight_number"),
+        "airplane": get("airplane"),
+        "travel_class": get("travel_class"),
+        "extensions": get("extensions", []),
+        "overnight": get("overnight", False),
+    }
+
+
+def _normalize_flight(flight_data, legs):
+    get = flight_data.get
+    first_leg = legs[0]
+    first = first_leg.get
+    return {
+        "price": get("price"),
+        "type": get("type"),
+        "airline": first("airline"),
+        "airline_logo": get("airline_logo") or first("airline_logo"),
+        "flight_number": first("flight_number"),
+        "airplane": first("airplane"),
+        "travel_class": first("travel_class"),
+        "departure_airport": first("departure_airport"),
+        "arrival_airport": first("arrival_airport"),
+        "duration": first("duration"),
+        "total_duration": get("total_duration"),
+        "stops": len(legs) - 1,
+        "layovers": get("layovers", []),
+        "carbon_emissions": get("carbon_emissions"),
+        "booking_token": get("booking_token"),
+        "extensions": first("extensions", []),
+        # Include all legs for round trips
+        "all_flights": [_normalize_leg(leg) for leg in legs],
+    }
+
+
+def iter_flights(results):
+    """
+    Yield normalized flight options from a SerpAPI Google Flights response
+    
+    Best flights come first, followed by other flights. Options without any
+    flight legs are skipped. A response reporting that the search found no
+    results yields nothing.
+    
+    Raises:
+        UpstreamRejected: If the response contains any other API error
+    """
+    if is_no_results(results):
+        return
+    if 'error' in results:
+        logger.warning("API Error: %s", results['error'])
+        raise UpstreamRejected(f"API Error: {results['error']}")
+    
+    for group in _RESULT_GROUPS:
+        for flight_data in results.get(group) or ():
+            legs = flight_data.get("flights")
+            if legs:
+                yield _normalize_flight(flight_data, legs)
+
+
+def _parse_results(results):
+    """Normalize a SerpAPI Google Flights response into a list of flight options"""
+    flights = list(iter_flights(results))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Normalized %d flights (best=%d, other=%d, search_id=%s)",
+            len(flights),
+            len(results.get("best_flights") or ()),
+            len(results.get("other_flights") or ()),
+            results.get("search_metadata", {}).get("id"),
+        )
+    return flights
+
+
+def _record_flights(results):
+    with stage("normalize"):
+        flights = _parse_results(results)
+    UPSTREAM_PAYLOAD_FLIGHTS.observe(len(flights))
+    return flights
+
+
+def search_flights(departure_id, arrival_id, outbound_date, return_date=None, adults=1, travel_class=1, flight_type=2, provider=None):
+    """
+    Search for flights using SerpAPI Google Flights API
+    
+    Args:
+        departure_id: Departure airport code (e.g., "JFK")
+        arrival_id: Arrival airport code (e.g., "LAX")
+        outbound_date: Departure date in YYYY-MM-DD format
+        return_date: Return date in YYYY-MM-DD format (optional, for round trips)
+        adults: Number of adult passengers (default: 1)
+        travel_class: Travel class (1=Economy, 2=Premium Economy, 3=Business, 4=First, default: 1)
+        flight_type: Trip type (1=Round-trip, 2=One-way, default: 1)
+        provider: Provider to query instead of the shared one (optional)
+    
+    Returns:
+        List of flight options with details
+    """
+    provider = provider or get_provider()
+    params = _build_params(provider, departure_id, arrival_id, outbound_date, return_date, adults, travel_class, flight_type)
     
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        
-        # Debug: Print the full results to see what we're getting
-        print("=" * 50)
-        print("API Response:")
-        print(f"Keys in results: {results.keys()}")
-        print(f"Search metadata: {results.get('search_metadata', {})}")
-        print(f"Best flights count: {len(results.get('best_flights', []))}")
-        print(f"Other flights count: {len(results.get('other_flights', []))}")
-        
-        # Check for errors in the response
-        if 'error' in results:
-            print(f"API Error: {results['error']}")
-            raise Exception(f"API Error: {results['error']}")
-        
-        # Extract flight information
-        flights = []
-        
-        # Check if we have best_flights or other_flights
-        best_flights = results.get("best_flights", [])
-        other_flights = results.get("other_flights", [])
-        
-        all_flights = best_flights + other_flights
-        
-        print(f"Total flights to process: {len(all_flights)}")
-        
-        for idx, flight_data in enumerate(all_flights):
-            print(f"\n--- Processing flight {idx + 1} ---")
-            print(f"Flight data keys: {flight_data.keys()}")
-            print(f"Number of flight legs: {len(flight_data.get('flights', []))}")
-            
-            # Extract all flight legs (for round trips, there will be multiple legs)
-            if "flights" in flight_data and len(flight_data["flights"]) > 0:
-                first_leg = flight_data["flights"][0]
-                
-                # For round trips, extract both outbound and return flights
-                all_legs = []
-                for leg in flight_data["flights"]:
-                    all_legs.append({
-                        "departure_airport": leg.get("departure_airport"),
-                        "arrival_airport": leg.get("arrival_airport"),
-                        "duration": leg.get("duration"),
-                        "airline": leg.get("airline"),
-                        "airline_logo": leg.get("airline_logo"),
-                        "flight_number": leg.get("flight_number"),
-                        "airplane": leg.get("airplane"),
-                        "travel_class": leg.get("travel_class"),
-                        "extensions": leg.get("extensions", []),
-                        "overnight": leg.get("overnight", False)
-                    })
-                
-                flight_info = {
-                    "price": flight_data.get("price"),
-                    "type": flight_data.get("type"),
-                    "airline": first_leg.get("airline"),
-                    "airline_logo": flight_data.get("airline_logo") or first_leg.get("airline_logo"),
-                    "flight_number": first_leg.get("flight_number"),
-                    "airplane": first_leg.get("airplane"),
-                    "travel_class": first_leg.get("travel_class"),
-                    "departure_airport": first_leg.get("departure_airport"),
-                    "arrival_airport": first_leg.get("arrival_airport"),
-                    "duration": first_leg.get("duration"),
-                    "total_duration": flight_data.get("total_duration"),
-                    "stops": len(flight_data["flights"]) - 1,
-                    "layovers": flight_data.get("layovers", []),
-                    "carbon_emissions": flight_data.get("carbon_emissions"),
-                    "booking_token": flight_data.get("booking_token"),
-                    "extensions": first_leg.get("extensions", []),
-                    "all_flights": all_legs  # Include all legs for round trips
-                }
-                
-                flights.append(flight_info)
-                print(f"Added flight: {flight_info['airline']} - ${flight_info['price']}")
-        
-        print(f"Returning {len(flights)} flights")
-        print("=" * 50)
-        
-        return flights
+        start = time.perf_counter()
+        try:
+            results = provider.fetch(params)
+        except Exception:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, outcome="error")
+            raise
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, outcome="ok")
+        return _record_flights(results)
+    
+    except ProviderError:
+        # Keep upstream error types so callers can tell outages from bad input
+        raise
     
     except Exception as e:
-        print(f"Exception in search_flights: {str(e)}")
+        logger.warning("Exception in search_flights: %s", e)
         raise Exception(f"Error searching flights: {str(e)}")
 
 
-GoogleSearch.SERP_API_KEY = GOOGLE_API_KEY
\ No newline at end of file
+async def search_flights_async(departure_id, arrival_id, outbound_date, return_date=None, adults=1, travel_class=1, flight_type=2, provider=None):
+    """
+    Awaitable variant of search_flights()
+    
+    The upstream call runs on the provider's pooled workers, so many searches
+    can be in flight at once from a single event loop.
+    """
+    provider = provider or get_provider()
+    params = _build_params(provider, departure_id, arrival_id, outbound_date, return_date, adults, travel_class, flight_type)
+    
+    try:
+        start = time.perf_counter()
+        try:
+            results = await provider.fetch_async(params)
+        except Exception:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, outcome="error")
+            raise
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, outcome="ok")
+        return _record_flights(results)
+    
+    except ProviderError:
+        # Keep upstream error types so callers can tell outages from bad input
+        raise
+    
+    except Exception as e:
+        logger.warning("Exception in search_flights_async: %s", e)
+        raise Exception(f"Error searching flights: {str(e)}")
@@ -0,0 +1,192 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name + _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels}", cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels}", series[-2]
+            yield f"{self.name}_count{labels}", series[-1]
+
+
+class CallbackMetric:
+    """
+    Metric whose value is read from a callback at scrape time
+
+    If `labelname` is set the callback returns a dict of label value ->
+    sample value, otherwise a single number.
+    """
+
+    def __init__(self, name, documentation, callback, kind="gauge", labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+        self.labelname = labelname
+
+    def samples(self):
+        value = self.callback()
+        if self.labelname is None:
+            yield self.name, value
+            return
+        for label, sample in sorted(value.items()):
+            yield self.name + _format_labels((self.labelname,), (label,)), sample
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def callback(self, name, documentation, callback, kind="gauge", labelname=None):
+        return self.register(CallbackMetric(name, documentation, callback, kind, labelname))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by endpoint",
+    labelnames=("endpoint", "status"),
+)
+RESPONSE_SIZE = registry.histogram(
+    "http_response_size_bytes",
+    "HTTP response body size by endpoint",
+    buckets=SIZE_BUCKETS,
+    labelnames=("endpoint",),
+)
+SEARCH_STAGE_LATENCY = registry.histogram(
+    "search_stage_duration_seconds",
+    "Time spent in each stage of a flight search",
+    labelnames=("stage",),
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_request_duration_seconds",
+    "SerpAPI call latency",
+    labelnames=("outcome",),
+)
+UPSTREAM_RESPONSE_SIZE = registry.histogram(
+    "upstream_response_size_bytes",
+    "SerpAPI response body size",
+    buckets=SIZE_BUCKETS,
+)
+UPSTREAM_PAYLOAD_FLIGHTS = registry.histogram(
+    "upstream_flights_per_response",
+    "Normalized flight options per SerpAPI response",
+    buckets=(0, 5, 10, 25, 50, 100, 200, 500),
+)
+
+
+def stage(name):
+    """Context manager timing one stage of the search path"""
+    return SEARCH_STAGE_LATENCY.time(stage=name)
@@ -0,0 +1,234 @@
+import heapq
+import math
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; pairs are then ranked in pure Python
+    np = None
+
+
+# Score units: per USD, per minute of flying, per stop and per kg of CO2e
+DEFAULT_WEIGHTS = {
+    "price": 1.0,
+    "duration": 0.2,
+    "stops": 25.0,
+    "emissions": 0.0,
+}
+
+MAX_PAIRING_OPTIONS = 500
+MAX_PAIRS = 100
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _float(value, field):
+    """Convert a JSON number (or numeric string) to a finite float, naming field if it is not one"""
+    if not isinstance(value, (int, float, str)):
+        raise ValueError(f"{field} must be a number")
+    try:
+        number = float(value)
+    except (ValueError, OverflowError):
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{field} must be a finite number")
+    return number
+
+
+def _optional_float(value, field):
+    return math.nan if value is None else _float(value, field)
+
+
+def _minutes(airport, field):
+    # Airport times look like "2023-10-03 15:10" (local time)
+    if airport is None:
+        return math.nan
+    if not isinstance(airport, dict) or not isinstance(airport.get("time") or "", str):
+        raise ValueError(f"{field} must be an airport with a time string")
+    try:
+        moment = datetime.fromisoformat(airport.get("time") or "")
+    except ValueError:
+        return math.nan
+    return (moment - _EPOCH).total_seconds() / 60
+
+
+def _number(value):
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def _features(flights, side):
+    """
+    Return per-flight (price, duration, stops, emissions kg, departs, arrives)
+
+    Missing values are NaN; departs/arrives are minutes since the epoch of
+    the first departure and the final arrival.
+
+    Raises:
+        ValueError: If a flight field has the wrong type; the message names
+                    the side ('outbound' or 'return'), flight and field
+    """
+    rows = []
+    for index, flight in enumerate(flights):
+        field = f"{side}[{index}]"
+        legs = flight.get("all_flights") or [flight]
+        if not isinstance(legs, list) or not all(isinstance(leg, dict) for leg in legs):
+            raise ValueError(f"{field}.all_flights must be a list of flight legs")
+        emissions = flight.get("carbon_emissions") or {}
+        if not isinstance(emissions, dict):
+            raise ValueError(f"{field}.carbon_emissions must be an object")
+        emissions = _optional_float(emissions.get("this_flight"), f"{field}.carbon_emissions.this_flight")
+        rows.append((
+            _optional_float(flight.get("price"), f"{field}.price"),
+            _optional_float(flight.get("total_duration"), f"{field}.total_duration"),
+            _float(flight.get("stops") or 0, f"{field}.stops"),
+            emissions / 1000,
+            _minutes(legs[0].get("departure_airport"), f"{field}.departure_airport"),
+            _minutes(legs[-1].get("arrival_airport"), f"{field}.arrival_airport"),
+        ))
+    return rows
+
+
+def parse_pairing_options(data):
+    """
+    Extract weights and constraints for pair ranking from a request payload
+
+    Args:
+        data: Request JSON; recognised keys are weights (price, duration,
+              stops, emissions), min_stay_hours, max_stay_hours,
+              max_total_price, max_total_stops and limit
+
+    Returns:
+        Normalized options dict
+
+    Raises:
+        ValueError: If an option is malformed
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    if not isinstance(data.get("weights") or {}, dict):
+        raise ValueError("weights must be an object")
+    for name, value in (data.get("weights") or {}).items():
+        if name not in weights:
+            raise ValueError(f"weights must only contain: {', '.join(DEFAULT_WEIGHTS)}")
+        weights[name] = _float(value, f"weights.{name}")
+
+    def number(field):
+        value = data.get(field)
+        return _float(value, field) if value not in (None, "") else None
+
+    options = {
+        "weights": weights,
+        "min_stay_hours": number("min_stay_hours") or 0.0,
+        "max_stay_hours": number("max_stay_hours"),
+        "max_total_price": number("max_total_price"),
+        "max_total_stops": number("max_total_stops"),
+    }
+    limit = data.get("limit")
+    options["limit"] = min(max(1, int(_float(limit, "limit"))), MAX_PAIRS) if limit not in (None, "") else 10
+    return options
+
+
+def _scores(rows, weights):
+    # The pair score is additive, so each side can be scored on its own
+    # Zero-weight terms are skipped so a missing value there does not matter
+    terms = [(index, weights[name]) for index, name in enumerate(("price", "duration", "stops", "emissions"))
+             if weights[name] or name == "price"]
+    return [sum(weight * row[index] for index, weight in terms) for row in rows]
+
+
+def _rank_numpy(out_rows, ret_rows, options, k):
+    out = np.array(out_rows, dtype=float).reshape(-1, 6)
+    ret = np.array(ret_rows, dtype=float).reshape(-1, 6)
+    weights = options["weights"]
+
+    score = np.add.outer(
+        np.array(_scores(out_rows, weights), dtype=float),
+        np.array(_scores(ret_rows, weights), dtype=float),
+    )
+    # Return must leave at least min_stay after the outbound flight lands
+    stay = ret[None, :, 4] - out[:, None, 5]
+    valid = stay >= options["min_stay_hours"] * 60
+    if options["max_stay_hours"] is not None:
+        valid &= stay <= options["max_stay_hours"] * 60
+    if options["max_total_price"] is not None:
+        valid &= out[:, None, 0] + ret[None, :, 0] <= options["max_total_price"]
+    if options["max_total_stops"] is not None:
+        valid &= out[:, None, 2] + ret[None, :, 2] <= options["max_total_stops"]
+    # NaN scores (e.g. no price) and NaN stays compare false and drop out here
+    valid &= ~np.isnan(score)
+    score = np.where(valid, score, np.inf)
+
+    flat = score.ravel()
+    k = min(k, int(valid.sum()))
+    if k == 0:
+        return []
+    top = np.argpartition(flat, k - 1)[:k]
+    # Ties are broken by position, as in the pure Python ranking
+    top = top[np.lexsort((top, flat[top]))]
+    columns = score.shape[1]
+    return [(float(flat[i]), int(i // columns), int(i % columns)) for i in top]
+
+
+def _rank_python(out_rows, ret_rows, options, k):
+    weights = options["weights"]
+    out_scores = _scores(out_rows, weights)
+    ret_scores = _scores(ret_rows, weights)
+    min_stay = options["min_stay_hours"] * 60
+    max_stay = options["max_stay_hours"] * 60 if options["max_stay_hours"] is not None else math.inf
+    max_price = options["max_total_price"] if options["max_total_price"] is not None else math.inf
+    max_stops = options["max_total_stops"] if options["max_total_stops"] is not None else math.inf
+
+    def candidates():
+        for i, o in enumerate(out_rows):
+            for j, r in enumerate(ret_rows):
+                score = out_scores[i] + ret_scores[j]
+                stay = r[4] - o[5]
+                if (min_stay <= stay <= max_stay and o[0] + r[0] <= max_price
+                        and o[2] + r[2] <= max_stops and not math.isnan(score)):
+                    yield score, i, j
+
+    return heapq.nsmallest(k, candidates())
+
+
+def rank_pairs(outbound, inbound, options):
+    """
+    Rank outbound/return combinations by weighted score, best first
+
+    Every pairing is scored as the weighted sum of total price, total
+    flying time, total stops and emissions. Pairs violating the stay or
+    total limits are skipped, as are flights without a price or times.
+    Stays are measured between local airport times.
+
+    Args:
+        outbound: Outbound flight list
+        inbound: Return flight list
+        options: Dict from parse_pairing_options()
+
+    Returns:
+        List of up to options['limit'] dicts with outbound_index,
+        return_index, score, total_price, total_duration, total_stops and
+        stay_minutes
+
+    Raises:
+        ValueError: If a flight has a field of the wrong type
+    """
+    out_rows = _features(outbound[:MAX_PAIRING_OPTIONS], "outbound")
+    ret_rows = _features(inbound[:MAX_PAIRING_OPTIONS], "return")
+    if not out_rows or not ret_rows:
+        return []
+
+    rank = _rank_numpy if np is not None else _rank_python
+    pairs = []
+    for score, i, j in rank(out_rows, ret_rows, options, options["limit"]):
+        o, r = out_rows[i], ret_rows[j]
+        pairs.append({
+            "outbound_index": i,
+            "return_index": j,
+            "score": round(score, 2),
+            "total_price": _number(o[0] + r[0]),
+            "total_duration": _number(o[1] + r[1]),
+            "total_stops": int(o[2] + r[2]),
+            "stay_minutes": int(r[4] - o[5]),
+        })
+    return pairs
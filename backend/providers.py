@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.metrics import UPSTREAM_RESPONSE_SIZE
+
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+RESPONSE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'response.json')
+)
+
+# Captured payloads may be abridged with "..." placeholder lines
+_ELISION_RE = re.compile(r"(?m)^\s*\.\.\.,?\s*\n")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[\]}])")
+
+
+def load_recorded_response(path):
+    """
+    Load a captured SerpAPI response from disk
+
+    Lines containing only "..." (as in abridged documentation samples such
+    as response.json) are dropped so the rest parses as JSON.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    text = _TRAILING_COMMA_RE.sub(r"\1", _ELISION_RE.sub("", text))
+    return json.loads(text)
+
+
+def is_no_results(results):
+    """Return True if a SerpAPI response reports that the search found nothing"""
+    # SerpAPI reports an empty search as an error rather than empty lists
+    return "hasn't returned any results" in str(results.get("error") or "")
+
+
+class ProviderError(Exception):
+    """Raised when an upstream provider fails to return a response"""
+
+
+class TransientProviderError(ProviderError):
+    """Upstream failure that may succeed if retried (timeouts, 429, 5xx)"""
+
+
+class UpstreamUnavailable(ProviderError):
+    """Upstream calls are being refused locally (open circuit, rate limit)"""
+
+
+class UpstreamRejected(ProviderError):
+    """Upstream answered with an error for the search; retrying will not help"""
+
+
+class FlightProvider:
+    """
+    Base class for upstream flight search providers
+
+    Subclasses implement fetch(), which takes SerpAPI-style Google Flights
+    query parameters and returns a SerpAPI-style response dict. submit() and
+    fetch_async() run fetch() on the provider's worker pool.
+    """
+
+    name = "base"
+    requires_api_key = False
+
+    def __init__(self, max_workers=16):
+        self.max_workers = max_workers
+        self._executor = self._new_executor()
+        # Worker threads and pooled connections do not survive fork(), so a
+        # provider built before a pre-forking server starts its workers
+        # rebuilds them in each worker
+        after_fork = weakref.WeakMethod(self._after_fork)
+        os.register_at_fork(after_in_child=lambda: after_fork() and after_fork()())
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def _after_fork(self):
+        self._executor = self._new_executor()
+
+    def fetch(self, params):
+        raise NotImplementedError
+
+    def submit(self, params):
+        """Schedule fetch() on the worker pool and return a Future"""
+        return self._executor.submit(self.fetch, params)
+
+    async def fetch_async(self, params):
+        """Awaitable fetch() that does not block the event loop"""
+        return await asyncio.wrap_future(self.submit(params))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class SerpApiProvider(FlightProvider):
+    """
+    Pooled SerpAPI client
+
+    Requests share one keep-alive connection pool and at most
+    `max_concurrency` upstream calls run at once, whether they are made
+    synchronously with fetch() or scheduled on the provider's worker pool
+    with submit() / fetch_async().
+    """
+
+    name = "serpapi"
+    requires_api_key = True
+
+    def __init__(self, api_key, max_concurrency=16, timeout=15.0):
+        super().__init__(max_workers=max_concurrency)
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.session = self._new_session()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _new_session(self):
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency))
+        return session
+
+    def _after_fork(self):
+        # Sockets inherited from the parent must not be shared with it
+        super()._after_fork()
+        self.session = self._new_session()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def fetch(self, params):
+        """
+        Run one search and return the decoded JSON response
+
+        Args:
+            params: SerpAPI query parameters (api_key is added here)
+
+        Returns:
+            Response dict (with an 'error' key if the search found nothing)
+
+        Raises:
+            TransientProviderError: On connection errors, timeouts, HTTP 429
+                                    or 5xx responses
+            UpstreamRejected: If the response reports any other error
+            ValueError: If the response body is not JSON
+        """
+        query = dict(params, api_key=self.api_key)
+        try:
+            with self._slots:
+                response = self.session.get(SERPAPI_URL, params=query, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientProviderError(f"SerpAPI request failed: {e}") from e
+
+        UPSTREAM_RESPONSE_SIZE.observe(len(response.content))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientProviderError(f"SerpAPI returned HTTP {response.status_code}")
+        results = response.json()
+        if 'error' in results and not is_no_results(results):
+            raise UpstreamRejected(f"SerpAPI error: {results['error']}")
+        return results
+
+    def close(self):
+        super().close()
+        self.session.close()
+
+
+class ReplayProvider(FlightProvider):
+    """
+    Offline provider serving recorded SerpAPI responses
+
+    Recordings are served round-robin regardless of the query, after an
+    injected delay of `latency` seconds plus up to `jitter` seconds. A
+    fraction `error_rate` of calls raise TransientProviderError instead.
+    """
+
+    name = "replay"
+
+    def __init__(self, paths=(RESPONSE_PATH,), latency=0.0, jitter=0.0, error_rate=0.0,
+                 seed=None, max_workers=16):
+        super().__init__(max_workers=max_workers)
+        self.responses = [load_recorded_response(path) for path in paths]
+        if not self.responses:
+            raise ValueError("ReplayProvider needs at least one recorded response")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _after_fork(self):
+        super()._after_fork()
+        self._lock = threading.Lock()
+
+    def fetch(self, params):
+        with self._lock:
+            response = self.responses[self._next % len(self.responses)]
+            self._next += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise TransientProviderError("Injected replay failure")
+        return response
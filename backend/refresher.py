@@ -0,0 +1,190 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from backend.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+# 0 disables background refreshing (and stale-while-revalidate)
+REFRESH_TOP_N = int(os.getenv("REFRESH_TOP_N", "0"))
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "15"))
+REFRESH_AHEAD = float(os.getenv("REFRESH_AHEAD", "60"))
+REFRESH_STALE_GRACE = float(os.getenv("REFRESH_STALE_GRACE", "120"))
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "2"))
+REFRESH_QPS = float(os.getenv("REFRESH_QPS", "1"))
+REFRESH_HALF_LIFE = float(os.getenv("REFRESH_HALF_LIFE", "600"))
+
+REFRESHES = registry.counter(
+    "cache_refreshes_total",
+    "Background cache refreshes by outcome",
+    labelnames=("outcome",),
+)
+
+
+class _Route:
+    """Popularity of one search: a request count decaying with REFRESH_HALF_LIFE"""
+
+    __slots__ = ("params", "score", "updated")
+
+    def __init__(self, params, now):
+        self.params = params
+        self.score = 0.0
+        self.updated = now
+
+    def decayed(self, now, half_life):
+        return self.score * 0.5 ** ((now - self.updated) / half_life)
+
+
+class CacheRefresher:
+    """
+    Keeps the most popular searches in the flight cache fresh
+
+    record() counts each foreground search. Every `interval` seconds the
+    `top_n` most popular searches whose cache entry expires within `ahead`
+    seconds (or has gone) are refreshed in the background. schedule() also
+    lets a request that was served a stale entry ask for an immediate
+    refresh.
+
+    Refreshes run on a dedicated pool of `concurrency` threads and call
+    `refresh(params)`, which is expected to use its own upstream budget, so
+    they never hold up foreground requests. A search is refreshed by at most
+    one thread at a time.
+    """
+
+    def __init__(self, cache, refresh, key=None, top_n=20, interval=15.0, ahead=60.0,
+                 stale_grace=120.0, concurrency=2, half_life=600.0, max_tracked=None):
+        self.cache = cache
+        self.refresh = refresh
+        self.key = key or (lambda params: tuple(sorted(params.items())))
+        self.top_n = top_n
+        self.interval = interval
+        self.ahead = ahead
+        self.stale_grace = stale_grace
+        self.half_life = half_life
+        self.max_tracked = max_tracked or max(100, top_n * 20)
+        self.concurrency = concurrency
+        self._start()
+        atexit.register(self.close)
+        # Threads do not survive fork(); each forked worker starts its own
+        # and tracks its own traffic
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._routes = {}
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cache-refresh")
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cache-refresher", daemon=True)
+        self._thread.start()
+
+    def record(self, params):
+        """Count one foreground search for params"""
+        key = self.key(params)
+        now = time.monotonic()
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                route = self._routes[key] = _Route(params, now)
+            route.score = route.decayed(now, self.half_life) + 1
+            route.updated = now
+            if len(self._routes) > self.max_tracked:
+                self._prune(now)
+
+    def schedule(self, params):
+        """
+        Refresh params in the background unless a refresh is already running
+
+        Returns:
+            True if a refresh was started
+        """
+        key = self.key(params)
+        with self._lock:
+            if key in self._inflight or self._stopped.is_set():
+                return False
+            self._inflight.add(key)
+        self._pool.submit(self._refresh, key, params)
+        return True
+
+    def popular(self):
+        """Return [(params, score)] for the top_n most popular searches"""
+        now = time.monotonic()
+        today = date.today().isoformat()
+        with self._lock:
+            # Searches for dates that have passed will not be asked for again
+            for key in [k for k, r in self._routes.items() if r.params["outbound_date"] < today]:
+                del self._routes[key]
+            ranked = sorted(
+                ((route.params, route.decayed(now, self.half_life)) for route in self._routes.values()),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+        return ranked[:self.top_n]
+
+    def refresh_due(self):
+        """Schedule refreshes for popular searches that are about to expire; return how many"""
+        started = 0
+        for params, _ in self.popular():
+            entry = self.cache.peek(self.key(params))
+            if entry is None or entry[1] <= self.ahead:
+                started += self.schedule(params)
+        return started
+
+    def stats(self):
+        with self._lock:
+            return {"tracked": len(self._routes), "inflight": len(self._inflight), "top_n": self.top_n}
+
+    def close(self):
+        """Stop scheduling refreshes and wait for running ones"""
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._thread.join()
+            self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh_due()
+            except Exception:
+                logger.exception("Cache refresh pass failed")
+
+    def _refresh(self, key, params):
+        try:
+            self.refresh(params)
+        except Exception as e:
+            logger.info("Background refresh of %s failed: %s", key, e)
+            REFRESHES.inc(outcome="error")
+        else:
+            REFRESHES.inc(outcome="ok")
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+    def _prune(self, now):
+        # Caller must hold self._lock; keep the most popular half
+        ranked = sorted(self._routes, key=lambda k: self._routes[k].decayed(now, self.half_life))
+        for key in ranked[:len(ranked) - self.max_tracked // 2]:
+            del self._routes[key]
+
+
+def create_refresher(cache, refresh, key=None):
+    """Return a CacheRefresher configured from the environment, or None if disabled"""
+    if REFRESH_TOP_N <= 0:
+        return None
+    return CacheRefresher(
+        cache,
+        refresh,
+        key=key,
+        top_n=REFRESH_TOP_N,
+        interval=REFRESH_INTERVAL,
+        ahead=REFRESH_AHEAD,
+        stale_grace=REFRESH_STALE_GRACE,
+        concurrency=REFRESH_CONCURRENCY,
+        half_life=REFRESH_HALF_LIFE,
+    )
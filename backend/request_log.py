@@ -0,0 +1,140 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date
+
+from backend.search import SEARCH_PARAMS, cache_key, cached_search_flights, flight_cache
+
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH")
+REQUEST_LOG_RESPONSES = os.getenv("REQUEST_LOG_RESPONSES", "0") == "1"
+CACHE_WARMUP_LOG = os.getenv("CACHE_WARMUP_LOG")
+CACHE_WARMUP_FETCH = os.getenv("CACHE_WARMUP_FETCH", "0") == "1"
+
+
+class RequestLog:
+    """
+    Append-only JSONL log of normalized search requests
+
+    log() only enqueues the record; a background thread batches records and
+    appends them to the file, so the request path never waits on disk. When
+    the queue is full new records are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, path, record_responses=False, flush_interval=1.0, max_queue=10000):
+        self.path = path
+        self.record_responses = record_responses
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.max_queue = max_queue
+        self._start()
+        atexit.register(self.close)
+        # The writer thread does not survive fork(); each forked worker
+        # starts its own
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+        self._thread.start()
+
+    def log(self, params, flights=None):
+        """Queue one search for writing; flights are kept only if record_responses is set"""
+        record = {"ts": time.time(), "params": params}
+        if self.record_responses and flights is not None:
+            record["flights"] = flights
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Stop the writer after flushing everything queued so far"""
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._stopped.wait(self.flush_interval)
+            self._flush()
+
+    def _flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch))
+        except OSError as e:
+            logger.warning("Failed to write %d request log records: %s", len(batch), e)
+
+
+def create_request_log():
+    """Return a RequestLog configured from the environment, or None if disabled"""
+    if not REQUEST_LOG_PATH:
+        return None
+    return RequestLog(REQUEST_LOG_PATH, record_responses=REQUEST_LOG_RESPONSES)
+
+
+def read_request_log(path):
+    """Yield records from a request log, skipping malformed lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            params = record.get("params") if isinstance(record, dict) else None
+            if isinstance(params, dict) and all(name in params for name in SEARCH_PARAMS):
+                yield record
+
+
+def warm_cache(path, fetch_missing=False):
+    """
+    Pre-warm the flight cache from a request log
+
+    Records with recorded flights are loaded straight into the cache for
+    whatever is left of the cache TTL since they were logged. Records without
+    them, or whose flights are too old to serve, are searched upstream only if
+    fetch_missing is set. Searches for dates that have passed are skipped.
+
+    Returns:
+        Number of searches loaded into the cache
+    """
+    # Later records win, and a record with flights beats one without
+    latest = {}
+    today = date.today().isoformat()
+    for record in read_request_log(path):
+        if str(record["params"]["outbound_date"]) < today:
+            continue
+        key = cache_key(record["params"])
+        if "flights" in record or "flights" not in latest.get(key, {}):
+            latest[key] = record
+
+    loaded = 0
+    now = time.time()
+    for key, record in latest.items():
+        remaining = flight_cache.ttl - (now - float(record.get("ts") or 0))
+        if "flights" in record and remaining > 0:
+            flight_cache.set(key, record["flights"], ttl=remaining)
+            loaded += 1
+        elif fetch_missing:
+            try:
+                cached_search_flights(record["params"])
+                loaded += 1
+            except Exception as e:
+                logger.warning("Cache warm-up search failed for %s: %s", key, e)
+    return loaded
@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from backend.metrics import registry
+from backend.providers import FlightProvider, TransientProviderError, UpstreamUnavailable
+from backend.ratelimit import TokenBucket
+
+
+RETRY_COUNTER = registry.counter("upstream_retries_total", "Upstream calls retried after a transient error")
+HEDGE_COUNTER = registry.counter("upstream_hedges_total", "Hedged upstream calls issued for slow requests")
+REJECTED_COUNTER = registry.counter(
+    "upstream_rejected_total",
+    "Upstream calls refused locally",
+    labelnames=("reason",),
+)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are refused for `reset_timeout` seconds. Then a single trial call
+    is let through (half-open): success closes the circuit, failure opens it
+    again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go upstream now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def release(self):
+        """Give up a half-open trial slot without recording an outcome"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff for the given retry attempt (1-based)"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+class ResilientProvider(FlightProvider):
+    """
+    Wraps a provider with rate limiting, retries, hedging and a circuit breaker
+
+    Every upstream attempt takes a token from a bucket shared by all threads
+    (waiting at most `rate_limit_wait` seconds). Transient errors are retried
+    up to `retries` times with jittered exponential backoff. With
+    `hedge_after` set, a second identical call is started if the first has
+    not finished by then and whichever succeeds first is used. Failures that
+    survive retries count towards the circuit breaker; while it is open,
+    calls fail immediately with UpstreamUnavailable.
+    """
+
+    def __init__(self, provider, qps=10.0, burst=None, rate_limit_wait=2.0, retries=2,
+                 retry_base_delay=0.2, retry_max_delay=2.0, hedge_after=None,
+                 failure_threshold=5, reset_timeout=30.0, max_workers=16):
+        super().__init__(max_workers=max_workers)
+        self.provider = provider
+        self.name = provider.name
+        self.requires_api_key = provider.requires_api_key
+        self.limiter = TokenBucket(qps, burst)
+        self.rate_limit_wait = rate_limit_wait
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def fetch(self, params):
+        if not self.breaker.allow():
+            REJECTED_COUNTER.inc(reason="circuit_open")
+            raise UpstreamUnavailable("Flight search is temporarily unavailable (upstream circuit open)")
+
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(params)
+            except UpstreamUnavailable:
+                # Rate limited locally: says nothing about upstream health
+                self.breaker.release()
+                raise
+            except TransientProviderError:
+                attempt += 1
+                if attempt > self.retries:
+                    self.breaker.record_failure()
+                    raise
+                RETRY_COUNTER.inc()
+                time.sleep(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay))
+                continue
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _take_token(self, timeout):
+        if not self.limiter.acquire(timeout=timeout):
+            REJECTED_COUNTER.inc(reason="rate_limited")
+            raise UpstreamUnavailable("Flight search is busy, please retry shortly (upstream rate limit)")
+
+    def _attempt(self, params):
+        self._take_token(self.rate_limit_wait)
+        if self.hedge_after is None:
+            return self.provider.fetch(params)
+
+        primary = self.provider.submit(params)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        # Only hedge if it does not mean waiting for quota
+        if not self.limiter.acquire(timeout=0):
+            return primary.result()
+        HEDGE_COUNTER.inc()
+        pending = {primary, self.provider.submit(params)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def close(self):
+        super().close()
+        self.provider.close()
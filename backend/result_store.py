@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH")
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "10000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+_EXPIRY_INDEX = "CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)"
+
+
+class ResultStore:
+    """
+    Persistent search result store shared by every worker process on a host
+
+    Results live in a SQLite database in WAL mode, so readers in one process
+    never block on a writer in another, and survive restarts. Values are
+    stored as zlib-compressed compact JSON with an absolute expiry time.
+    Expired rows are purged, and the oldest-expiring rows evicted once the
+    store holds more than `max_entries`, every `sweep_interval` writes.
+    """
+
+    def __init__(self, path, ttl=300, max_entries=10000, sweep_interval=100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        conn.execute(_EXPIRY_INDEX)
+        conn.commit()
+
+    def _connect(self):
+        # One connection per thread, reopened in forked workers
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(list(key), separators=(",", ":"))
+
+    def get(self, key, allow_expired=False):
+        """
+        Return the stored value for key, or None if absent, expired or unreadable
+
+        With allow_expired, expired rows that have not been swept yet are
+        returned too.
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM results WHERE key = ? AND expires_at > ?",
+                (self._encode_key(key), 0 if allow_expired else time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            logger.warning("Result store read failed: %s", e)
+            return None
+
+    def peek(self, key):
+        """
+        Return (value, seconds until expiry) for key, or None if absent or unreadable
+
+        Expired rows that have not been swept yet are returned with a
+        negative expiry.
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM results WHERE key = ?",
+                (self._encode_key(key),),
+            ).fetchone()
+            if row is None:
+                return None
+            return json.loads(zlib.decompress(row[0])), row[1] - time.time()
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            logger.warning("Result store read failed: %s", e)
+            return None
+
+    def set(self, key, value):
+        """Store value for key; failures are logged and otherwise ignored"""
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (self._encode_key(key), blob, time.time() + self.ttl),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Result store write failed: %s", e)
+            return
+
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.sweep_interval == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired rows and evict the oldest rows above max_entries"""
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Result store sweep failed: %s", e)
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+def create_result_store(ttl):
+    """Return a ResultStore configured from the environment, or None if disabled"""
+    if not RESULT_STORE_PATH:
+        return None
+    return ResultStore(RESULT_STORE_PATH, ttl=ttl, max_entries=RESULT_STORE_MAX_ENTRIES)
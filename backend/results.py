@@ -0,0 +1,165 @@
+import base64
+import hashlib
+import json
+import math
+
+
+def _carbon(flight):
+    return (flight.get("carbon_emissions") or {}).get("this_flight")
+
+
+SORT_KEYS = {
+    "price": lambda flight: flight.get("price"),
+    "total_duration": lambda flight: flight.get("total_duration"),
+    "stops": lambda flight: flight.get("stops"),
+    "carbon_emissions": _carbon,
+}
+
+MAX_LIMIT = 200
+
+
+def _departure_time(flight):
+    # Airport times look like "2023-10-03 15:10"
+    time = (flight.get("departure_airport") or {}).get("time") or ""
+    return time[11:16]
+
+
+def _parse_time(value, field):
+    value = str(value).strip()
+    hours, sep, minutes = value.partition(":")
+    if not (sep and hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60):
+        raise ValueError(f"Invalid time for {field}: {value} (expected HH:MM)")
+    return f"{int(hours):02d}:{int(minutes):02d}"
+
+
+def _optional_number(data, field, cast):
+    value = data.get(field)
+    if value in (None, ""):
+        return None
+    if not isinstance(value, (int, float, str)):
+        raise ValueError(f"{field} must be a number")
+    try:
+        number = cast(value)
+    except (ValueError, OverflowError):
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{field} must be a finite number")
+    return number
+
+
+def parse_result_query(data):
+    """
+    Extract sort, filter and pagination options from a search payload
+
+    Args:
+        data: Request JSON; recognised keys are sort (price, total_duration,
+              stops or carbon_emissions, prefix with '-' for descending),
+              max_stops, max_price, airlines (list or comma-separated),
+              departure_after / departure_before (HH:MM), limit and cursor
+
+    Returns:
+        Normalized query dict
+
+    Raises:
+        ValueError: If an option is malformed
+    """
+    query = {"sort": None, "descending": False}
+
+    sort = data.get("sort")
+    if sort:
+        if not isinstance(sort, str):
+            raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+        query["descending"] = sort.startswith("-")
+        query["sort"] = sort.lstrip("-")
+        if query["sort"] not in SORT_KEYS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+
+    query["max_stops"] = _optional_number(data, "max_stops", int)
+    query["max_price"] = _optional_number(data, "max_price", float)
+
+    airlines = data.get("airlines") or []
+    if isinstance(airlines, str):
+        airlines = airlines.split(",")
+    if not isinstance(airlines, list) or not all(isinstance(a, str) for a in airlines):
+        raise ValueError("airlines must be a list or comma-separated string of airline names")
+    query["airlines"] = sorted({a.strip().lower() for a in airlines if a.strip()}) or None
+
+    for field in ("departure_after", "departure_before"):
+        query[field] = _parse_time(data[field], field) if data.get(field) else None
+
+    limit = _optional_number(data, "limit", int)
+    query["limit"] = min(max(1, limit), MAX_LIMIT) if limit is not None else None
+    query["offset"] = _decode_cursor(data["cursor"], query) if data.get("cursor") else 0
+    return query
+
+
+def _fingerprint(query):
+    # Everything except the page position; a cursor is only valid for the
+    # same sort and filters it was issued for
+    view = {k: v for k, v in query.items() if k not in ("limit", "offset")}
+    return hashlib.sha1(json.dumps(view, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _encode_cursor(offset, query):
+    raw = json.dumps({"o": offset, "q": _fingerprint(query)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor, query):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset = int(data["o"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if offset < 0 or data.get("q") != _fingerprint(query):
+        raise ValueError("Cursor does not match the requested sort and filters")
+    return offset
+
+
+def _matches(flight, query):
+    if query["max_stops"] is not None and (flight.get("stops") or 0) > query["max_stops"]:
+        return False
+    if query["max_price"] is not None:
+        price = flight.get("price")
+        if price is None or price > query["max_price"]:
+            return False
+    if query["airlines"] is not None:
+        legs = flight.get("all_flights") or [flight]
+        if any((leg.get("airline") or "").lower() not in query["airlines"] for leg in legs):
+            return False
+    if query["departure_after"] or query["departure_before"]:
+        departs = _departure_time(flight)
+        if not departs:
+            return False
+        if query["departure_after"] and departs < query["departure_after"]:
+            return False
+        if query["departure_before"] and departs > query["departure_before"]:
+            return False
+    return True
+
+
+def apply_result_query(flights, query):
+    """
+    Filter, sort and paginate a cached flight list without modifying it
+
+    Flights missing the sort field are placed last. Without a sort the
+    upstream order (best flights first) is kept.
+
+    Returns:
+        Tuple of (page, total matching flights, next_cursor or None)
+    """
+    selected = [flight for flight in flights if _matches(flight, query)]
+
+    if query["sort"]:
+        key = SORT_KEYS[query["sort"]]
+        present = [flight for flight in selected if key(flight) is not None]
+        missing = [flight for flight in selected if key(flight) is None]
+        present.sort(key=key, reverse=query["descending"])
+        selected = present + missing
+
+    total = len(selected)
+    start = min(query["offset"], total)
+    end = total if query["limit"] is None else min(start + query["limit"], total)
+    next_cursor = _encode_cursor(end, query) if end < total else None
+    return selected[start:end], total, next_cursor
@@ -0,0 +1,698 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import date, timedelta
+from backend.airports import load_airport_index
+from backend.cache import FlightCache
+from backend.fanout import fan_out, iter_fan_out
+from backend.flight_api import create_resilient_provider, search_flights
+from backend.metrics import registry
+from backend.providers import ProviderError, UpstreamRejected, UpstreamUnavailable
+from backend.ratelimit import TokenBucket
+from backend.refresher import REFRESH_CONCURRENCY, REFRESH_QPS, create_refresher
+from backend.result_store import create_result_store
+
+
+# Normalized parameter order; also the layout of the cache key tuple
+SEARCH_PARAMS = (
+    "departure_id",
+    "arrival_id",
+    "outbound_date",
+    "return_date",
+    "adults",
+    "travel_class",
+    "flight_type",
+)
+
+logger = logging.getLogger(__name__)
+
+STALE_SERVED = registry.counter(
+    "flight_cache_stale_served_total",
+    "Expired results served, because upstream failed or while a refresh runs",
+    labelnames=("reason",),
+)
+
+# Limits for date-range (calendar) searches
+CALENDAR_MAX_SEARCHES = int(os.getenv("CALENDAR_MAX_SEARCHES", "60"))
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", "8"))
+CALENDAR_SEARCH_TIMEOUT = float(os.getenv("CALENDAR_SEARCH_TIMEOUT", "20"))
+CALENDAR_UPSTREAM_QPS = float(os.getenv("CALENDAR_UPSTREAM_QPS", "5"))
+
+# Limits for batch searches
+BATCH_MAX_SEARCHES = int(os.getenv("BATCH_MAX_SEARCHES", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_SEARCH_TIMEOUT = float(os.getenv("BATCH_SEARCH_TIMEOUT", "20"))
+
+# Limits for "any airport in the city" searches
+METRO_MAX_AIRPORTS = int(os.getenv("METRO_MAX_AIRPORTS", "3"))
+METRO_CONCURRENCY = int(os.getenv("METRO_CONCURRENCY", "6"))
+METRO_SEARCH_TIMEOUT = float(os.getenv("METRO_SEARCH_TIMEOUT", "20"))
+
+# How far ahead a search may be made (Google Flights covers about a year)
+SEARCH_MAX_DAYS_AHEAD = int(os.getenv("SEARCH_MAX_DAYS_AHEAD", "365"))
+
+flight_cache = FlightCache(
+    ttl=int(os.getenv("FLIGHT_CACHE_TTL", "300")),
+    max_entries=int(os.getenv("FLIGHT_CACHE_SIZE", "1024")),
+)
+
+# Searches that recently came back empty or with an upstream error, so
+# repeating them does not cost another upstream call
+negative_cache = FlightCache(
+    ttl=int(os.getenv("NEGATIVE_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("NEGATIVE_CACHE_SIZE", "4096")),
+)
+
+NEGATIVE_HITS = registry.counter(
+    "flight_negative_cache_hits_total",
+    "Searches answered from the negative cache without an upstream call",
+)
+
+# Shared state built on first use, or up front by the app's warm-up: the
+# index of known airport and metro area codes, the optional on-disk result
+# store shared by all worker processes (RESULT_STORE_PATH) and the
+# background refresher for popular searches (REFRESH_TOP_N > 0). The store
+# and refresher may be disabled (None), so _UNSET marks "not built yet"
+_UNSET = object()
+_airport_index = None
+_result_store = _UNSET
+_refresher = _UNSET
+_state_lock = threading.Lock()
+
+
+def get_airport_index():
+    """Return the airport index, loading it on first use"""
+    global _airport_index
+    if _airport_index is None:
+        with _state_lock:
+            if _airport_index is None:
+                _airport_index = load_airport_index()
+    return _airport_index
+
+
+def get_result_store():
+    """Return the on-disk result store, opening it on first use, or None if not configured"""
+    global _result_store
+    if _result_store is _UNSET:
+        with _state_lock:
+            if _result_store is _UNSET:
+                _result_store = create_result_store(ttl=flight_cache.ttl)
+    return _result_store
+
+
+def get_refresher():
+    """Return the background refresher, starting it on first use, or None if disabled"""
+    global _refresher
+    if _refresher is _UNSET:
+        with _state_lock:
+            if _refresher is _UNSET:
+                _refresher = create_refresher(flight_cache, refresh_search, key=cache_key)
+    return _refresher
+
+_IATA_RE = re.compile(r"^[A-Z]{3}$")
+
+
+def _airport_code(data, field):
+    code = str(data[field]).strip().upper()
+    if not _IATA_RE.match(code):
+        raise ValueError(f"Invalid airport code for {field}: {data[field]}")
+    if code not in get_airport_index():
+        raise ValueError(f"Unknown airport code: {code}")
+    return code
+
+
+def _int_in_range(data, field, default, low, high):
+    try:
+        value = int(data.get(field, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a whole number")
+    if not low <= value <= high:
+        raise ValueError(f"{field} must be between {low} and {high}")
+    return value
+
+
+def _check_search_date(day, field):
+    # One day of slack, so a client in a time zone behind the server can
+    # still search for its own today
+    today = date.today()
+    if day < today - timedelta(days=1):
+        raise ValueError(f"{field} is in the past")
+    if day > today + timedelta(days=SEARCH_MAX_DAYS_AHEAD):
+        raise ValueError(f"{field} is more than {SEARCH_MAX_DAYS_AHEAD} days ahead")
+
+
+def normalize_search_params(data):
+    """
+    Validate a request payload and build the normalized search_flights keyword arguments
+
+    Everything that would make the upstream search fail or come back empty
+    is rejected here, before any upstream call.
+
+    Args:
+        data: Request JSON with departure_id, arrival_id, outbound_date and
+              optional return_date, adults, travel_class and type
+
+    Returns:
+        Dict keyed by SEARCH_PARAMS, with upper-case codes and ISO dates
+
+    Raises:
+        ValueError: If a required field is missing, an airport code is
+                    unknown, a date is invalid, in the past or out of range,
+                    or a number is malformed
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+
+    for field in ("departure_id", "arrival_id", "outbound_date"):
+        if not data.get(field):
+            raise ValueError(f"Missing required field: {field}")
+
+    departure_id = _airport_code(data, "departure_id")
+    arrival_id = _airport_code(data, "arrival_id")
+    if departure_id == arrival_id:
+        raise ValueError("Departure and arrival airports must differ")
+
+    flight_type = _int_in_range(data, "type", 1, 1, 2)
+    outbound_date = _parse_date(data["outbound_date"], "outbound_date")
+    _check_search_date(outbound_date, "outbound_date")
+
+    # search_flights ignores return_date for one-way searches, so drop it
+    # here to let those requests share a cache entry
+    return_date = None
+    if flight_type == 1:
+        if not data.get("return_date"):
+            raise ValueError("Missing required field: return_date")
+        return_date = _parse_date(data["return_date"], "return_date")
+        if return_date < outbound_date:
+            raise ValueError("return_date must not be before outbound_date")
+        _check_search_date(return_date, "return_date")
+        return_date = return_date.isoformat()
+
+    return {
+        "departure_id": departure_id,
+        "arrival_id": arrival_id,
+        "outbound_date": outbound_date.isoformat(),
+        "return_date": return_date,
+        "adults": _int_in_range(data, "adults", 1, 1, 9),
+        "travel_class": _int_in_range(data, "travel_class", 1, 1, 4),
+        "flight_type": flight_type,
+    }
+
+
+def cache_key(params):
+    """Return the hashable cache key for normalized search params"""
+    return tuple(params[name] for name in SEARCH_PARAMS)
+
+
+calendar_limiter = TokenBucket(CALENDAR_UPSTREAM_QPS)
+
+_refresh_provider = None
+_refresh_provider_lock = threading.Lock()
+
+
+class _NoFlights(Exception):
+    """Raised by the cache loader so an empty result is not cached for the full TTL"""
+
+
+def _search_upstream(key, params, provider=None):
+    """
+    Search upstream, remembering empty and rejected searches in the negative cache
+
+    Raises:
+        _NoFlights: If the search came back empty
+    """
+    try:
+        flights = search_flights(provider=provider, **params)
+    except UpstreamRejected as e:
+        # Upstream rejected the search; retrying it soon will not help
+        negative_cache.set(key, ("error", (type(e), str(e))))
+        raise
+    except (ProviderError, ValueError):
+        raise
+    except Exception as e:
+        # e.g. an unreadable response, which is as likely to recur
+        negative_cache.set(key, ("error", (type(e), str(e))))
+        raise
+    if not flights:
+        negative_cache.set(key, ("empty", None))
+        raise _NoFlights()
+    return flights
+
+
+def refresh_search(params):
+    """
+    Search upstream and replace the cached result for params
+
+    Used by the background refresher. Calls go through a separate provider
+    with its own rate limit (REFRESH_QPS) and no retries, so refreshing never
+    uses up the quota or connections of foreground searches. Empty and
+    rejected searches go to the negative cache as in cached_search_flights()
+    and are not tried again until their negative entry expires.
+    """
+    global _refresh_provider
+    if _refresh_provider is None:
+        with _refresh_provider_lock:
+            if _refresh_provider is None:
+                _refresh_provider = create_resilient_provider(
+                    qps=REFRESH_QPS,
+                    rate_limit_wait=0,
+                    retries=0,
+                    hedge_after=None,
+                    max_workers=REFRESH_CONCURRENCY,
+                )
+    key = cache_key(params)
+    if negative_cache.get(key) is not None:
+        return []
+    try:
+        flights = _search_upstream(key, params, provider=_refresh_provider)
+    except _NoFlights:
+        return []
+    flight_cache.set(key, flights)
+    result_store = get_result_store()
+    if result_store is not None:
+        result_store.set(key, flights)
+    return flights
+
+
+def cached_search_flights(params, limiter=None, timeout=None):
+    """
+    Search flights through the shared result cache
+
+    Identical concurrent misses are coalesced into a single upstream call.
+    In-process misses check the on-disk result store, when configured,
+    before going upstream. If upstream fails, an expired result for the
+    same search is served instead when one is still held.
+
+    With the background refresher enabled, a result that expired less than
+    REFRESH_STALE_GRACE seconds ago is returned immediately and refreshed in
+    the background.
+
+    Searches that came back empty or failed with a non-transient upstream
+    error are remembered for NEGATIVE_CACHE_TTL seconds; repeats return the
+    same outcome without going upstream.
+
+    Args:
+        params: Normalized params from normalize_search_params()
+        limiter: Optional TokenBucket consulted before each upstream call
+                 (cache hits are not rate limited)
+        timeout: Seconds from now the search may spend waiting for a
+                 limiter token (None waits indefinitely)
+
+    Returns:
+        List of flight options (shared, do not mutate)
+
+    Raises:
+        UpstreamUnavailable: If no limiter token came within timeout
+    """
+    key = cache_key(params)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    result_store = get_result_store()
+    refresher = get_refresher()
+
+    negative = negative_cache.get(key)
+    if negative is not None:
+        NEGATIVE_HITS.inc()
+        if negative[0] == "empty":
+            return []
+        error_type, message = negative[1]
+        raise error_type(message)
+
+    if refresher is not None:
+        entry = flight_cache.peek(key)
+        if entry is not None and -refresher.stale_grace < entry[1] <= 0:
+            refresher.schedule(params)
+            STALE_SERVED.inc(reason="revalidating")
+            return entry[0]
+
+    def load():
+        # Returns (flights, ttl); a stored result is only cached in-process
+        # for the time it has left in the store
+        if result_store is not None:
+            stored = result_store.peek(key)
+            if stored is not None and stored[1] > 0:
+                return stored
+        if limiter is not None:
+            wait = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if not limiter.acquire(timeout=wait):
+                raise UpstreamUnavailable("Search timed out waiting for upstream quota")
+        flights = _search_upstream(key, params)
+        if result_store is not None:
+            result_store.set(key, flights)
+        return flights, None
+
+    try:
+        return flight_cache.get_or_load(key, load, with_ttl=True)
+    except _NoFlights:
+        # Kept out of the result caches so the empty result expires sooner
+        return []
+    except ProviderError as e:
+        stale = flight_cache.get_stale(key)
+        if stale is None and result_store is not None:
+            stale = result_store.get(key, allow_expired=True)
+        if stale is None:
+            raise
+        logger.warning("Serving stale results for %s: %s", key, e)
+        STALE_SERVED.inc(reason="upstream_error")
+        return stale
+
+
+def roundtrip_legs(params):
+    """
+    Split round-trip params into one-way (outbound, return) searches
+
+    Raises:
+        ValueError: If params has no return_date
+    """
+    if not params.get("return_date"):
+        raise ValueError("Missing required field: return_date")
+
+    outbound = dict(params, flight_type=2, return_date=None)
+    inbound = dict(
+        params,
+        departure_id=params["arrival_id"],
+        arrival_id=params["departure_id"],
+        outbound_date=params["return_date"],
+        flight_type=2,
+        return_date=None,
+    )
+    return outbound, inbound
+
+
+def search_roundtrip(params):
+    """
+    Search both directions of a round trip at the same time
+
+    Each direction is a one-way search, matching how the frontend lets the
+    user pick the outbound and return flights separately.
+
+    Args:
+        params: Normalized params with a return_date
+
+    Returns:
+        Dict with 'outbound' and 'return' flight lists
+
+    Raises:
+        ValueError: If params has no return_date
+    """
+    outbound_result, return_result = fan_out(cached_search_flights, roundtrip_legs(params))
+    return {
+        "outbound": outbound_result.get(),
+        "return": return_result.get(),
+    }
+
+
+def _parse_date(value, field):
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid date for {field}: {value}")
+
+
+def date_range(start, end):
+    """Return the ISO dates from start to end inclusive"""
+    days = (end - start).days
+    return [(start + timedelta(days=i)).isoformat() for i in range(days + 1)]
+
+
+def normalize_date_grid_params(data):
+    """
+    Build the search grid for a flexible-date request
+
+    Args:
+        data: Request JSON with departure_id, arrival_id, outbound_date_from,
+              outbound_date_to and optional return_date, return_flex_days,
+              adults and travel_class
+
+    Returns:
+        Tuple of (base params, list of (outbound_date, return_date) pairs);
+        return_date is None for one-way grids
+
+    Raises:
+        ValueError: If fields are missing, dates are invalid or the grid is
+                    larger than CALENDAR_MAX_SEARCHES
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+
+    for field in ("outbound_date_from", "outbound_date_to"):
+        if not data.get(field):
+            raise ValueError(f"Missing required field: {field}")
+
+    start = _parse_date(data["outbound_date_from"], "outbound_date_from")
+    end = _parse_date(data["outbound_date_to"], "outbound_date_to")
+    if end < start:
+        raise ValueError("outbound_date_to must not be before outbound_date_from")
+    # Bound every date before sizing or building the grid
+    _check_search_date(start, "outbound_date_from")
+    _check_search_date(end, "outbound_date_to")
+
+    first_return = last_return = None
+    if data.get("return_date"):
+        return_day = _parse_date(data["return_date"], "return_date")
+        flex = _int_in_range(data, "return_flex_days", 0, 0, SEARCH_MAX_DAYS_AHEAD)
+        try:
+            first_return = return_day - timedelta(days=flex)
+            last_return = return_day + timedelta(days=flex)
+        except OverflowError:
+            raise ValueError("return_date and return_flex_days give dates out of range")
+        _check_search_date(return_day, "return_date")
+        _check_search_date(last_return, "return_date")
+
+    # Count the outbound/return pairs with the return on or after the
+    # outbound date, at most one loop over the (now bounded) outbound range
+    if first_return is None:
+        size = (end - start).days + 1
+    else:
+        size = sum(
+            max(0, (last_return - max(start + timedelta(days=i), first_return)).days + 1)
+            for i in range((end - start).days + 1)
+        )
+    if not size:
+        raise ValueError("No valid outbound/return date combinations")
+    if size > CALENDAR_MAX_SEARCHES:
+        raise ValueError(f"Date range too large: {size} searches (max {CALENDAR_MAX_SEARCHES})")
+
+    return_dates = date_range(first_return, last_return) if first_return is not None else [None]
+    grid = [
+        (outbound, ret)
+        for outbound in date_range(start, end)
+        for ret in return_dates
+        if ret is None or ret >= outbound
+    ]
+
+    # Validates the route and the first date pair
+    first_outbound, first_return = grid[0]
+    base = normalize_search_params(dict(
+        data,
+        outbound_date=first_outbound,
+        return_date=first_return,
+        type=1 if first_return else 2,
+    ))
+    return base, grid
+
+
+def _calendar_search(params):
+    # Stops waiting for quota at the per-search deadline, so a search that
+    # has already been reported as timed out neither keeps its fan-out
+    # thread nor spends quota afterwards
+    return cached_search_flights(params, limiter=calendar_limiter, timeout=CALENDAR_SEARCH_TIMEOUT)
+
+
+def search_date_grid(base, grid, include_flights=False):
+    """
+    Search every date pair of a flexible-date request concurrently
+
+    Searches share the calendar concurrency limit, per-search deadline and
+    upstream QPS budget.
+
+    Args:
+        base: Normalized params from normalize_date_grid_params()
+        grid: List of (outbound_date, return_date) pairs
+        include_flights: Include the full flight list for each date pair
+
+    Returns:
+        List of calendar entries in grid order with outbound_date,
+        return_date, cheapest_price and count (or error)
+    """
+    searches = [
+        dict(base, outbound_date=outbound, return_date=ret)
+        for outbound, ret in grid
+    ]
+    results = fan_out(
+        _calendar_search,
+        searches,
+        max_concurrency=CALENDAR_CONCURRENCY,
+        timeout=CALENDAR_SEARCH_TIMEOUT,
+    )
+
+    calendar = []
+    for (outbound, ret), result in zip(grid, results):
+        entry = {"outbound_date": outbound, "return_date": ret}
+        if not result.ok:
+            entry["error"] = str(result.error)
+        else:
+            prices = [f["price"] for f in result.value if f.get("price") is not None]
+            entry["cheapest_price"] = min(prices) if prices else None
+            entry["count"] = len(result.value)
+            if include_flights:
+                entry["flights"] = result.value
+        calendar.append(entry)
+    return calendar
+
+
+def normalize_stream_searches(data):
+    """
+    Build the labelled searches of a streaming request
+
+    A payload with outbound_date_from/outbound_date_to is a date grid (see
+    normalize_date_grid_params) labelled by date; split_legs searches both
+    directions of a round trip as 'outbound' and 'return'; anything else is
+    a single 'outbound' search.
+
+    Returns:
+        Tuple of (list of (label, params), is_calendar)
+
+    Raises:
+        ValueError: If the payload is invalid
+    """
+    if isinstance(data, dict) and data.get("outbound_date_from"):
+        base, grid = normalize_date_grid_params(data)
+        searches = [
+            (f"{outbound}/{ret}" if ret else outbound, dict(base, outbound_date=outbound, return_date=ret))
+            for outbound, ret in grid
+        ]
+        return searches, True
+
+    if isinstance(data, dict) and data.get("split_legs"):
+        outbound, inbound = roundtrip_legs(normalize_search_params(dict(data, type=1)))
+        return [("outbound", outbound), ("return", inbound)], False
+    return [("outbound", normalize_search_params(data))], False
+
+
+def iter_searches(searches, calendar=False):
+    """
+    Run labelled searches concurrently, yielding each result as it completes
+
+    Calendar searches share the date-range concurrency limit, deadline and
+    upstream QPS budget used by search_date_grid().
+
+    Yields:
+        (label, params, FanOutResult) in completion order
+    """
+    if calendar:
+        fn = _calendar_search
+        options = {"max_concurrency": CALENDAR_CONCURRENCY, "timeout": CALENDAR_SEARCH_TIMEOUT}
+    else:
+        fn, options = cached_search_flights, {}
+
+    for index, result in iter_fan_out(fn, [params for _, params in searches], **options):
+        label, params = searches[index]
+        yield label, params, result
+
+
+def search_batch(searches):
+    """
+    Run a batch of searches, each distinct search only once
+
+    Searches with the same cache key are collapsed before anything runs; the
+    distinct ones run concurrently under the batch concurrency limit and
+    per-search deadline.
+
+    Args:
+        searches: List of normalized params
+
+    Returns:
+        Tuple of (list of FanOutResult in the order of searches, number of
+        distinct searches)
+    """
+    unique = {}
+    for params in searches:
+        unique.setdefault(cache_key(params), params)
+
+    results = fan_out(
+        cached_search_flights,
+        unique.values(),
+        max_concurrency=BATCH_CONCURRENCY,
+        timeout=BATCH_SEARCH_TIMEOUT,
+    )
+    by_key = dict(zip(unique, results))
+    return [by_key[cache_key(params)] for params in searches], len(unique)
+
+
+def _price(flight):
+    price = flight.get("price")
+    return float("inf") if price is None else price
+
+
+def _itinerary_key(flight):
+    legs = flight.get("all_flights") or [flight]
+    return tuple(
+        (leg.get("flight_number"), (leg.get("departure_airport") or {}).get("time"))
+        for leg in legs
+    )
+
+
+def search_metro(params, origins, destinations, on_route=None):
+    """
+    Search every origin/destination airport combination and merge the results
+
+    Combinations run concurrently under the metro concurrency limit and
+    per-search deadline. The same itinerary found by several searches is
+    kept once (cheapest copy), and the merged list is ordered by price then
+    total duration, flights without a price last.
+
+    Args:
+        params: Normalized params; departure_id/arrival_id are replaced by
+                each combination
+        origins: Departure airport codes
+        destinations: Arrival airport codes
+        on_route: Optional callable taking (route params, FanOutResult),
+                  called for each route once it has been searched
+
+    Returns:
+        Tuple of (merged flight list, list of per-route dicts with
+        departure_id, arrival_id and count or error)
+
+    Raises:
+        Exception: The first route's error if every route failed
+    """
+    routes = [
+        dict(params, departure_id=origin, arrival_id=destination)
+        for origin in origins
+        for destination in destinations
+        if origin != destination
+    ]
+    if not routes:
+        raise ValueError("Departure and arrival airports must differ")
+
+    results = fan_out(
+        cached_search_flights,
+        routes,
+        max_concurrency=METRO_CONCURRENCY,
+        timeout=METRO_SEARCH_TIMEOUT,
+    )
+
+    merged = {}
+    summary = []
+    for route, result in zip(routes, results):
+        if on_route is not None:
+            on_route(route, result)
+        entry = {"departure_id": route["departure_id"], "arrival_id": route["arrival_id"]}
+        if not result.ok:
+            entry["error"] = str(result.error)
+        else:
+            entry["count"] = len(result.value)
+            for flight in result.value:
+                key = _itinerary_key(flight)
+                kept = merged.get(key)
+                if kept is None or _price(flight) < _price(kept):
+                    merged[key] = flight
+        summary.append(entry)
+
+    if all(not result.ok for result in results):
+        raise results[0].error
+
+    flights = sorted(merged.values(), key=lambda f: (_price(f), f.get("total_duration") or 0))
+    return flights, summary
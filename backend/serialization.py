@@ -0,0 +1,152 @@
+import json
+
+from flask import Response
+
+from backend.flight_api import FLIGHT_FIELDS, LEG_FIELDS
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize obj to compact UTF-8 JSON bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(payload, status=200):
+    """Flask response with a body encoded by dumps()"""
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+
+def encode_event(event, payload, sse=False):
+    """
+    Encode one record of a streamed response
+
+    The record is payload plus a 'type' of event. It is written as a
+    newline-delimited JSON line, or as a Server-Sent Event named event.
+    """
+    data = dumps({"type": event, **payload})
+    if sse:
+        return b"event: " + event.encode("utf-8") + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+
+def parse_fields(fields):
+    """
+    Parse a field projection
+
+    Args:
+        fields: List or comma-separated string of flight fields; leg fields
+                are selected with "all_flights.<field>"
+
+    Returns:
+        Tuple of (flight fields, leg fields or None for all leg fields),
+        or None when no projection was requested
+
+    Raises:
+        ValueError: If fields is not a string or list of strings, or a
+                    field is unknown
+    """
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+        raise ValueError("fields must be a list or comma-separated string of field names")
+
+    flight_fields = []
+    leg_fields = []
+    for field in (f.strip() for f in fields if f.strip()):
+        name, _, leg_field = field.partition(".")
+        if name not in FLIGHT_FIELDS or (leg_field and (name != "all_flights" or leg_field not in LEG_FIELDS)):
+            raise ValueError(f"Unknown field: {field}")
+        if name not in flight_fields:
+            flight_fields.append(name)
+        if leg_field:
+            leg_fields.append(leg_field)
+    return tuple(flight_fields), tuple(leg_fields) or None
+
+
+def project(flights, projection):
+    """Return copies of flights holding only the projected fields"""
+    if projection is None:
+        return flights
+    flight_fields, leg_fields = projection
+
+    projected = []
+    for flight in flights:
+        record = {field: flight.get(field) for field in flight_fields}
+        if leg_fields is not None and "all_flights" in record:
+            record["all_flights"] = [
+                {field: leg.get(field) for field in leg_fields}
+                for leg in record["all_flights"] or ()
+            ]
+        projected.append(record)
+    return projected
+
+
+class _Table:
+    """Value -> index lookup table preserving first-seen order"""
+
+    def __init__(self, key=None):
+        self.values = []
+        self._index = {}
+        self._key = key or (lambda value: value)
+
+    def ref(self, value):
+        key = self._key(value)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def encode_compact(flights):
+    """
+    Dictionary-encode airports, airlines and logos of a flight list
+
+    Airport objects become {"airport": index, "time": ...} referencing the
+    'airports' table ({"id", "name"}); airline and airline_logo values become
+    indexes into the 'airlines' and 'logos' tables. This applies to flights
+    and to their all_flights legs; other fields are left as they are.
+
+    Returns:
+        Dict with 'airports', 'airlines', 'logos' and 'flights'
+    """
+    airports = _Table(key=lambda airport: (airport.get("id"), airport.get("name")))
+    airlines = _Table()
+    logos = _Table()
+
+    def encode(record):
+        encoded = dict(record)
+        for field in ("departure_airport", "arrival_airport"):
+            airport = record.get(field)
+            if isinstance(airport, dict):
+                encoded[field] = {
+                    "airport": airports.ref({"id": airport.get("id"), "name": airport.get("name")}),
+                    "time": airport.get("time"),
+                }
+        if record.get("airline") is not None:
+            encoded["airline"] = airlines.ref(record["airline"])
+        if record.get("airline_logo") is not None:
+            encoded["airline_logo"] = logos.ref(record["airline_logo"])
+        return encoded
+
+    encoded_flights = []
+    for flight in flights:
+        encoded = encode(flight)
+        if flight.get("all_flights"):
+            encoded["all_flights"] = [encode(leg) for leg in flight["all_flights"]]
+        encoded_flights.append(encoded)
+
+    return {
+        "airports": airports.values,
+        "airlines": airlines.values,
+        "logos": logos.values,
+        "flights": encoded_flights,
+    }
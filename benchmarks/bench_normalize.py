@@ -0,0 +1,131 @@
+"""
+Microbenchmark for SerpAPI response normalization
+
+Compares the current flight_api normalizer with the previous print-based
+loop on the captured response.json payload.
+
+Usage:
+    python -m benchmarks.bench_normalize [--scale 50] [--repeat 200]
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+
+from backend.flight_api import _parse_results
+from backend.providers import load_recorded_response
+
+
+def legacy_parse_results(results):
+    """The normalization loop as it was before the streaming rewrite"""
+    print("=" * 50)
+    print("API Response:")
+    print(f"Keys in results: {results.keys()}")
+    print(f"Search metadata: {results.get('search_metadata', {})}")
+    print(f"Best flights count: {len(results.get('best_flights', []))}")
+    print(f"Other flights count: {len(results.get('other_flights', []))}")
+
+    flights = []
+    all_flights = results.get("best_flights", []) + results.get("other_flights", [])
+    print(f"Total flights to process: {len(all_flights)}")
+
+    for idx, flight_data in enumerate(all_flights):
+        print(f"\n--- Processing flight {idx + 1} ---")
+        print(f"Flight data keys: {flight_data.keys()}")
+        print(f"Number of flight legs: {len(flight_data.get('flights', []))}")
+
+        if "flights" in flight_data and len(flight_data["flights"]) > 0:
+            first_leg = flight_data["flights"][0]
+            all_legs = []
+            for leg in flight_data["flights"]:
+                all_legs.append({
+                    "departure_airport": leg.get("departure_airport"),
+                    "arrival_airport": leg.get("arrival_airport"),
+                    "duration": leg.get("duration"),
+                    "airline": leg.get("airline"),
+                    "airline_logo": leg.get("airline_logo"),
+                    "flight_number": leg.get("flight_number"),
+                    "airplane": leg.get("airplane"),
+                    "travel_class": leg.get("travel_class"),
+                    "extensions": leg.get("extensions", []),
+                    "overnight": leg.get("overnight", False)
+                })
+
+            flight_info = {
+                "price": flight_data.get("price"),
+                "type": flight_data.get("type"),
+                "airline": first_leg.get("airline"),
+                "airline_logo": flight_data.get("airline_logo") or first_leg.get("airline_logo"),
+                "flight_number": first_leg.get("flight_number"),
+                "airplane": first_leg.get("airplane"),
+                "travel_class": first_leg.get("travel_class"),
+                "departure_airport": first_leg.get("departure_airport"),
+                "arrival_airport": first_leg.get("arrival_airport"),
+                "duration": first_leg.get("duration"),
+                "total_duration": flight_data.get("total_duration"),
+                "stops": len(flight_data["flights"]) - 1,
+                "layovers": flight_data.get("layovers", []),
+                "carbon_emissions": flight_data.get("carbon_emissions"),
+                "booking_token": flight_data.get("booking_token"),
+                "extensions": first_leg.get("extensions", []),
+                "all_flights": all_legs
+            }
+            flights.append(flight_info)
+            print(f"Added flight: {flight_info['airline']} - ${flight_info['price']}")
+
+    print(f"Returning {len(flights)} flights")
+    print("=" * 50)
+    return flights
+
+
+def scaled_response(path, scale):
+    """Repeat the captured flight groups so each parse sees a realistic result count"""
+    results = load_recorded_response(path)
+    results["best_flights"] = results.get("best_flights", []) * scale
+    results["other_flights"] = results.get("other_flights", []) * scale
+    return results
+
+
+def time_parse(parse, results, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(results)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--response', default=os.path.join(ROOT, 'response.json'))
+    parser.add_argument('--scale', type=int, default=50, help='copies of each captured flight group')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    results = scaled_response(args.response, args.scale)
+    if _parse_results(results) != _quiet(legacy_parse_results, results):
+        sys.exit("Normalizer output differs from the legacy loop")
+
+    # The legacy loop writes to stdout; send it to /dev/null so the
+    # comparison measures formatting and write calls, not the terminal
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        legacy = time_parse(legacy_parse_results, results, args.repeat)
+    current = time_parse(_parse_results, results, args.repeat)
+
+    count = len(_parse_results(results))
+    print(f"flights per response: {count}")
+    print(f"legacy:  {legacy * 1e6:10.1f} us/response")
+    print(f"current: {current * 1e6:10.1f} us/response")
+    print(f"speedup: {legacy / current:10.2f}x")
+
+
+def _quiet(parse, results):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return parse(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Cold-start benchmark
+
+Starts fresh interpreters with the offline replay provider and measures the
+import time of backend.app, the create_app() warm-up, the latency of the
+first request to each endpoint and the wall time from process launch until
+the first search has been answered. "lazy" leaves the warm-up to the first
+request; "factory" calls create_app() first, as the production entry point
+does.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PROBE = """
+import json, time
+from datetime import date, timedelta
+started = time.perf_counter()
+import backend.app as backend_app
+result = {"import_ms": (time.perf_counter() - started) * 1000, "warm_up_ms": 0.0}
+if FACTORY:
+    mark = time.perf_counter()
+    backend_app.create_app()
+    result["warm_up_ms"] = (time.perf_counter() - mark) * 1000
+client = backend_app.app.test_client()
+search = {
+    "departure_id": "JFK", "arrival_id": "LAX", "type": "2",
+    "outbound_date": (date.today() + timedelta(days=30)).isoformat(),
+}
+requests = [
+    ("search", lambda: client.post("/search-flights", json=search)),
+    ("airports", lambda: client.get("/api/airports", headers={"Accept-Encoding": "gzip"})),
+    ("index", lambda: client.get("/")),
+]
+for name, send in requests:
+    mark = time.perf_counter()
+    status = send().status_code
+    result[name + "_ms"] = (time.perf_counter() - mark) * 1000
+    assert status == 200, (name, status)
+    if name == "search":
+        result["first_search_at"] = time.time()
+print(json.dumps(result))
+"""
+
+COLUMNS = ("import_ms", "warm_up_ms", "search_ms", "airports_ms", "index_ms", "time_to_first_search_ms")
+
+
+def probe(factory):
+    """Run one fresh interpreter and return its measurements"""
+    env = dict(os.environ, FLIGHT_PROVIDER="replay", PYTHONDONTWRITEBYTECODE="0")
+    launched = time.time()
+    output = subprocess.run(
+        [sys.executable, "-c", f"FACTORY = {factory}\n" + PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["time_to_first_search_ms"] = (result.pop("first_search_at") - launched) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per mode (median is reported)')
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} " + " ".join(f"{column[:-3]:>22}" for column in COLUMNS) + "   (ms, median)")
+    for mode, factory in (("lazy", False), ("factory", True)):
+        runs = [probe(factory) for _ in range(args.runs)]
+        medians = [statistics.median(run[column] for run in runs) for column in COLUMNS]
+        print(f"{mode:<8} " + " ".join(f"{value:>22.1f}" for value in medians))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Load-testing harness for the flight search and airport endpoints
+
+By default the Flask app runs in-process with the offline replay provider,
+so no server, browser or API key is needed. Pass --url to drive a running
+server instead.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 16 --requests 2000
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --endpoint airports
+    python -m benchmarks.load_test --replay-log requests.jsonl --replay-speed 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+
+ROUTES = [
+    ("JFK", "LAX"), ("LHR", "CDG"), ("SFO", "NRT"), ("DXB", "SIN"), ("ORD", "MIA"),
+    ("YYZ", "YYC"), ("PEK", "AUS"), ("DAC", "JFK"), ("SYD", "AKL"), ("FRA", "IST"),
+]
+AIRPORT_QUERIES = ["J", "LON", "new york", "heathrow", "par", "tok", "DAC", "san"]
+
+
+def search_body(i, unique_routes):
+    """Return the i-th search payload, cycling through `unique_routes` distinct searches"""
+    key = i % max(1, unique_routes)
+    departure, arrival = ROUTES[key % len(ROUTES)]
+    outbound = date.today() + timedelta(days=30 + key // len(ROUTES))
+    return {
+        "departure_id": departure,
+        "arrival_id": arrival,
+        "outbound_date": outbound.isoformat(),
+        "type": "2",
+    }
+
+
+def build_requests(endpoint, count, unique_routes):
+    """Return (name, method, path, body, offset) tuples for the run"""
+    plan = []
+    searches = lookups = 0
+    for i in range(count):
+        kind = endpoint if endpoint != "both" else ("search" if i % 2 == 0 else "airports")
+        if kind == "search":
+            plan.append(("search", "POST", "/search-flights", search_body(searches, unique_routes), None))
+            searches += 1
+        else:
+            query = AIRPORT_QUERIES[lookups % len(AIRPORT_QUERIES)]
+            plan.append(("airports", "GET", "/api/airports/search?q=" + urllib.parse.quote(query), None, None))
+            lookups += 1
+    return plan
+
+
+def build_replay_requests(path, count=None, speed=None):
+    """
+    Return a plan that replays searches from a request log
+
+    With `speed` set, each request is scheduled at its original offset from
+    the first record divided by speed, reproducing the recorded load shape.
+    """
+    from backend.request_log import read_request_log
+
+    plan = []
+    first_ts = None
+    for record in read_request_log(path):
+        params = record["params"]
+        body = {
+            "departure_id": params["departure_id"],
+            "arrival_id": params["arrival_id"],
+            "outbound_date": params["outbound_date"],
+            "return_date": params["return_date"],
+            "adults": params["adults"],
+            "travel_class": params["travel_class"],
+            "type": params["flight_type"],
+        }
+        if first_ts is None:
+            first_ts = record.get("ts", 0)
+        offset = (record.get("ts", 0) - first_ts) / speed if speed else None
+        plan.append(("search", "POST", "/search-flights", body, offset))
+        if count is not None and len(plan) >= count:
+            break
+    return plan
+
+
+class InProcessClient:
+    """Sends requests through Flask's test client"""
+
+    def __init__(self):
+        from backend.app import create_app
+        # Warm up first so the first requests do not pay for it
+        self.app = create_app()
+
+    def send(self, method, path, body):
+        client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a running server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def run(client, plan, concurrency):
+    """Execute the plan with `concurrency` workers; returns (samples, wall time)"""
+    samples = []  # (name, seconds, ok)
+    lock = threading.Lock()
+    position = iter(plan)
+
+    def worker():
+        while True:
+            with lock:
+                item = next(position, None)
+            if item is None:
+                return
+            name, method, path, body, offset = item
+            if offset is not None:
+                delay = run_start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.perf_counter()
+            try:
+                ok = client.send(method, path, body) < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append((name, elapsed, ok))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    run_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - run_start
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def report(samples, wall):
+    print(f"{'endpoint':<10} {'count':>7} {'errors':>7} {'req/s':>9} "
+          f"{'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name in sorted({name for name, _, _ in samples}) + ["total"]:
+        selected = [s for s in samples if name == "total" or s[0] == name]
+        latencies = sorted(elapsed for _, elapsed, _ in selected)
+        errors = sum(1 for _, _, ok in selected if not ok)
+        print(f"{name:<10} {len(selected):>7} {errors:>7} {len(selected) / wall:>9.1f} "
+              f"{statistics.mean(latencies) * 1e3:>9.2f} "
+              f"{percentile(latencies, 50) * 1e3:>9.2f} "
+              f"{percentile(latencies, 95) * 1e3:>9.2f} "
+              f"{percentile(latencies, 99) * 1e3:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server (default: in-process app)')
+    parser.add_argument('--endpoint', choices=('search', 'airports', 'both'), default='both')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--unique-routes', type=int, default=10,
+                        help='distinct searches in the mix (controls the cache hit rate)')
+    parser.add_argument('--latency-ms', type=float, default=200,
+                        help='injected replay provider latency (in-process only)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='injected replay provider error rate (in-process only)')
+    parser.add_argument('--upstream-qps', type=float, default=0,
+                        help='upstream rate limit (in-process only; default 0 = unlimited, '
+                             'so the run measures the app rather than the limiter)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='disable the flight result and negative caches and stale fallback (in-process only)')
+    parser.add_argument('--replay-log', help='replay searches from a request log (REQUEST_LOG_PATH)')
+    parser.add_argument('--replay-speed', type=float,
+                        help='replay at the recorded pace times this factor (default: as fast as possible)')
+    args = parser.parse_args()
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        os.environ["FLIGHT_PROVIDER"] = "replay"
+        os.environ["REPLAY_LATENCY_MS"] = str(args.latency_ms)
+        os.environ["REPLAY_ERROR_RATE"] = str(args.error_rate)
+        os.environ["UPSTREAM_QPS"] = str(args.upstream_qps)
+        if args.no_cache:
+            # No entries are kept at all, so expired ones cannot be served
+            # as stale results either; concurrent misses are still coalesced
+            os.environ["FLIGHT_CACHE_TTL"] = "0"
+            os.environ["FLIGHT_CACHE_SIZE"] = "0"
+            os.environ["NEGATIVE_CACHE_TTL"] = "0"
+        client = InProcessClient()
+
+    if args.replay_log:
+        plan = build_replay_requests(args.replay_log, args.requests, args.replay_speed)
+    else:
+        plan = build_requests(args.endpoint, args.requests, args.unique_routes)
+    samples, wall = run(client, plan, args.concurrency)
+    print(f"{len(samples)} requests, concurrency {args.concurrency}, {wall:.2f}s wall time")
+    report(samples, wall)
+
+
+if __name__ == '__main__':
+    main()
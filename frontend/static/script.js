@@ -8,36 +8,43 @@ setInterval(() => {
 }, 5000);
 
 // Airport autocomplete
-let airportData = [];
+const AIRPORT_SEARCH_DELAY = 120; // ms to wait after the last keystroke
 
-// Fetch airport data
-fetch('/api/airports')
-    .then(r => r.json())
-    .then(data => {
-        airportData = data;
-    })
-    .catch(e => console.error('Failed to load airports:', e));
+function fetchAirportMatches(query) {
+    return fetch(`/api/airports/search?q=${encodeURIComponent(query)}&limit=8`)
+        .then(r => r.json())
+        .catch(e => {
+            console.error('Failed to search airports:', e);
+            return [];
+        });
+}
 
 // Autocomplete setup
 function setupAutocomplete(inputId, dropdownId) {
     const input = document.getElementById(inputId);
     const dropdown = document.getElementById(dropdownId);
+    let debounceTimer = null;
+    let latestQuery = '';
     
     input.addEventListener('input', function() {
         const value = this.value.toUpperCase().trim();
+        latestQuery = value;
+        clearTimeout(debounceTimer);
         
         if (value.length < 1) {
             dropdown.classList.add('hidden');
             return;
         }
         
-        // Filter airports
-        const matches = airportData.filter(airport => {
-            return airport.code.startsWith(value) || 
-                   airport.city.toUpperCase().includes(value) ||
-                   airport.name.toUpperCase().includes(value);
-        }).slice(0, 8); // Limit to 8 results
-        
+        debounceTimer = setTimeout(async () => {
+            const matches = await fetchAirportMatches(value);
+            // Ignore responses for queries the user has already typed past
+            if (value !== latestQuery) return;
+            renderMatches(matches);
+        }, AIRPORT_SEARCH_DELAY);
+    });
+    
+    function renderMatches(matches) {
         if (matches.length > 0) {
             dropdown.innerHTML = matches.map(airport => `
                 <div class="px-4 py-3 hover:bg-blue-600/30 cursor-pointer border-b border-white/5 last:border-0" 
@@ -56,7 +63,7 @@ function setupAutocomplete(inputId, dropdownId) {
         } else {
             dropdown.classList.add('hidden');
         }
-    });
+    }
     
     // Close dropdown when clicking outside
     document.addEventListener('click', function(e) {
@@ -86,7 +93,8 @@ let searchState = {
     isRoundTrip: true,
     outboundSelected: null,
     searchingFor: 'outbound', // 'outbound' or 'return'
-    searchParams: null
+    searchParams: null,
+    returnFlights: null // return leg fetched alongside the outbound leg
 };
 
 tripSelect.addEventListener("change", () => {
@@ -104,6 +112,7 @@ tripSelect.addEventListener("change", () => {
 function resetSearchState() {
     searchState.outboundSelected = null;
     searchState.searchingFor = 'outbound';
+    searchState.returnFlights = null;
     itinerarySection.classList.add('hidden');
     selectedFlightsContainer.innerHTML = '';
     flightResults.innerHTML = '';
@@ -155,26 +164,51 @@ flightForm.addEventListener("submit", async (e) => {
         formData.return_date = null;
     }
     
+    // Return flights were already fetched together with the outbound leg
+    if (searchState.searchingFor === 'return' && searchState.returnFlights) {
+        displayFlights(searchState.returnFlights);
+        return;
+    }
+    
+    // Round trips fetch both legs in one request so the return leg is ready
+    // by the time an outbound flight is selected
+    const fetchBothLegs = searchState.searchingFor === 'outbound' &&
+                          searchState.isRoundTrip && formData.return_date;
+    const searchingFor = searchState.searchingFor;
+    
     // Show loading, hide results
     loadingIndicator.classList.remove("hidden");
     flightResults.innerHTML = "";
     
     try {
-        const response = await fetch("/search-flights", {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json"
-            },
-            body: JSON.stringify(formData)
-        });
+        // Results are streamed, so cards are shown as soon as the first leg arrives
+        const flights = { outbound: [], return: [] };
+        const errors = {};
+        let rendered = 0;
         
-        const data = await response.json();
+        await streamFlights({ ...formData, split_legs: Boolean(fetchBothLegs) }, record => {
+            if (record.type === 'flight') {
+                flights[record.search].push(record.flight);
+            } else if (record.type === 'error') {
+                errors[record.search] = record.error;
+            }
+        }, () => {
+            if (flights.outbound.length > rendered && searchState.searchingFor === searchingFor) {
+                rendered = flights.outbound.length;
+                loadingIndicator.classList.add("hidden");
+                displayFlights(flights.outbound);
+            }
+        });
         
-        if (!response.ok) {
-            throw new Error(data.error || "Failed to fetch flights");
+        if (errors.outbound && flights.outbound.length === 0) {
+            throw new Error(errors.outbound);
+        }
+        if (fetchBothLegs && !errors.return) {
+            searchState.returnFlights = flights.return;
+        }
+        if (rendered === 0) {
+            displayFlights(flights.outbound);
         }
-        
-        displayFlights(data.flights);
     } catch (error) {
         flightResults.innerHTML = `
             <div class="bg-red-900/30 border border-red-500 text-red-200 p-6 rounded-xl">
@@ -187,6 +221,37 @@ flightForm.addEventListener("submit", async (e) => {
     }
 });
 
+// Streams newline-delimited records from /search-flights/stream, calling
+// onRecord for every record and onChunk after each chunk has been read
+async function streamFlights(body, onRecord, onChunk) {
+    const response = await fetch("/search-flights/stream", {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "Accept": "application/x-ndjson"
+        },
+        body: JSON.stringify(body)
+    });
+    
+    if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || "Failed to fetch flights");
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffered.split('\n');
+        buffered = done ? '' : lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onRecord(JSON.parse(line)));
+        onChunk();
+        if (done) break;
+    }
+}
+
 function selectFlight(flight) {
     if (searchState.searchingFor === 'outbound') {
         // Store outbound flight
@@ -1,4 +1,16 @@
-from backend.app import app
+import os
+
+from dotenv import load_dotenv
+
+# Settings are read when the backend modules are imported, so .env is
+# loaded first
+load_dotenv()
+
+from backend.app import create_app  # noqa: E402
+
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
+    # Development server; set FLASK_DEBUG=1 for the debugger and reloader.
+    # Use wsgi.py with a production server instead (see README).
+    app.run(debug=os.getenv('FLASK_DEBUG', '0') == '1', host='127.0.0.1', port=5000)
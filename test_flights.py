@@ -10,9 +10,15 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
+from datetime import date, timedelta
 import time
 
 
+def future_date(days):
+    """Date input value (MM/DD/YYYY) `days` from today; past dates are rejected by the backend"""
+    return (date.today() + timedelta(days=days)).strftime("%m/%d/%Y")
+
+
 def setup_driver():
     """Initialize Chrome WebDriver"""
     options = webdriver.ChromeOptions()
@@ -67,7 +73,7 @@ def test_one_way_flight_search(driver):
         # Select departure date (tomorrow)
         print("Step 4: Selecting departure date...")
         departure_date = driver.find_element(By.ID, "departureDate")
-        departure_date.send_keys("12/20/2025")
+        departure_date.send_keys(future_date(30))
         time.sleep(1)
         
         # Select travelers
@@ -161,14 +167,14 @@ def test_round_trip_flight_search(driver):
         print("Step 4: Selecting departure date...")
         departure_date = driver.find_element(By.ID, "departureDate")
         departure_date.clear()
-        departure_date.send_keys("12/24/2025")
+        departure_date.send_keys(future_date(34))
         time.sleep(1)
         
         # Select return date
         print("Step 5: Selecting return date...")
         return_date = driver.find_element(By.ID, "returnDate")
         return_date.clear()
-        return_date.send_keys("12/26/2025")
+        return_date.send_keys(future_date(36))
         time.sleep(1)
         
         # Submit search for outbound flights
@@ -217,12 +223,9 @@ def test_round_trip_flight_search(driver):
         search_return_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Search Return Flights')]")
         search_return_button.click()
         
-        # Wait for return flight results
-        WebDriverWait(driver, 3).until(
-            EC.visibility_of_element_located((By.ID, "loadingIndicator"))
-        )
+        # Wait for return flight results (fetched together with the outbound leg)
         WebDriverWait(driver, 30).until(
-            EC.invisibility_of_element_located((By.ID, "loadingIndicator"))
+            EC.presence_of_element_located((By.XPATH, "//button[contains(text(), 'Select Return')]"))
         )
         
         # Verify return flights are displayed
@@ -0,0 +1,78 @@
+"""
+Shared fixtures for the offline backend tests
+
+Searches go to a ReplayProvider serving the recorded response.json, so no
+API key or network access is needed:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+
+from backend import flight_api, search  # noqa: E402
+from backend.providers import ReplayProvider  # noqa: E402
+
+
+class CountingReplay(ReplayProvider):
+    """ReplayProvider that counts upstream fetches"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def fetch(self, params):
+        with self._lock:
+            self.calls += 1
+        return super().fetch(params)
+
+
+class RecordingRefresher:
+    """Stands in for the CacheRefresher to capture recorded searches"""
+
+    def __init__(self):
+        self.recorded = []
+
+    def record(self, params):
+        self.recorded.append(params)
+
+
+def future(days):
+    """ISO date `days` from today"""
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def search_params(days=30, departure_id="JFK", arrival_id="LAX"):
+    """Normalized one-way search params"""
+    return search.normalize_search_params({
+        "departure_id": departure_id,
+        "arrival_id": arrival_id,
+        "outbound_date": future(days),
+        "type": "2",
+    })
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Install a counting replay provider as the shared provider, with empty caches"""
+    replay = CountingReplay()
+    monkeypatch.setattr(flight_api, "_provider", replay)
+    search.flight_cache.clear()
+    search.negative_cache.clear()
+    yield replay
+    search.flight_cache.clear()
+    search.negative_cache.clear()
+    replay.close()
+
+
+@pytest.fixture
+def client(provider):
+    """Flask test client for the warmed-up app, searching the replay provider"""
+    from backend.app import create_app
+    return create_app().test_client()
@@ -0,0 +1,86 @@
+import gzip
+import json
+
+import pytest
+
+from backend.airports import brotli
+from backend.search import get_airport_index
+
+
+def codes(query, limit=8):
+    return [airport["code"] for airport in get_airport_index().search(query, limit)]
+
+
+def test_exact_code_ranks_first():
+    assert codes("lhr")[0] == "LHR"
+    assert codes("JFK")[0] == "JFK"
+
+
+def test_code_prefix_matches_come_before_city_matches():
+    assert all(code.startswith("JF") for code in codes("jf"))
+
+
+def test_city_matches_come_before_name_matches():
+    results = get_airport_index().search("new york", 20)
+    cities = [airport["city"] for airport in results]
+    assert {"JFK", "LGA"} <= {airport["code"] for airport in results}
+    # Newburgh's Stewart airport only has "New York" in its name
+    assert cities[-1] == "Newburgh"
+    assert set(cities[:-1]) == {"New York"}
+
+
+def test_substring_fallback():
+    assert codes("eathro") == ["LHR"]
+
+
+def test_blank_query_and_limit():
+    assert codes("   ") == []
+    assert len(codes("a", 3)) == 3
+
+
+def test_search_endpoint_caps_limit(client):
+    response = client.get("/api/airports/search?q=a&limit=500")
+    assert response.status_code == 200
+    assert len(response.get_json()) == 50
+
+
+def test_airport_list_is_served_compressed(client):
+    plain = client.get("/api/airports")
+    assert plain.status_code == 200
+    assert "Content-Encoding" not in plain.headers
+    airports = plain.get_json()
+
+    packed = client.get("/api/airports", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert packed.headers["Vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(packed.data)) == airports
+    assert packed.headers["ETag"] != plain.headers["ETag"]
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_airport_list_prefers_brotli(client):
+    response = client.get("/api/airports", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(response.data)) == client.get("/api/airports").get_json()
+
+
+def test_airport_list_columns_format(client):
+    records = client.get("/api/airports").get_json()
+    columns = client.get("/api/airports?format=columns").get_json()
+    assert columns["code"] == [airport["code"] for airport in records]
+    assert len(columns["name"]) == len(columns["city"]) == len(columns["country"]) == len(records)
+    assert client.get("/api/airports?format=xml").status_code == 400
+
+
+def test_airport_list_revalidates_with_etag(client):
+    etag = client.get("/api/airports").headers["ETag"]
+    response = client.get("/api/airports", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # The tag of one encoding also validates the others
+    response = client.get("/api/airports", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+
+    response = client.get("/api/airports", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
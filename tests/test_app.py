@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_import_builds_no_shared_state():
+    probe = (
+        "import backend.app as app, backend.search as search\n"
+        "assert search._airport_index is None\n"
+        "assert search._result_store is search._UNSET and search._refresher is search._UNSET\n"
+        "assert app.airport_payloads is None and not app.warm_up_status['steps']\n"
+    )
+    subprocess.run([sys.executable, "-c", probe], cwd=ROOT, check=True,
+                   env=dict(os.environ, FLIGHT_PROVIDER="replay"))
+
+
+def test_health_reports_each_warm_up_step(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+
+    payload = response.get_json()
+    assert payload["ready"] and payload["status"] == "ok"
+    assert {"airport_index", "airport_payloads", "result_store", "refresher", "provider"} <= set(payload["warm_up"]["steps"])
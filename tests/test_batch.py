@@ -0,0 +1,56 @@
+from backend import search
+from conftest import RecordingRefresher, future
+
+
+SEARCH = {"departure_id": "JFK", "arrival_id": "LAX", "type": 2}
+
+
+def batch(client, searches):
+    return client.post("/search-flights/batch", json={"searches": searches})
+
+
+def test_identical_searches_run_once(client, provider):
+    search = dict(SEARCH, outbound_date=future(30))
+    response = batch(client, [search, dict(search, limit=2), dict(search, outbound_date=future(31))])
+    assert response.status_code == 200
+
+    payload = response.get_json()
+    assert payload["count"] == 3 and payload["searches"] == 2
+    assert provider.calls == 2
+    assert payload["results"][1]["count"] == 2
+    assert payload["results"][0]["total"] == payload["results"][1]["total"]
+
+
+def test_items_fail_on_their_own(client, provider):
+    search = dict(SEARCH, outbound_date=future(30))
+    results = batch(client, [
+        search,
+        dict(search, departure_id="ZZZ"),
+        dict(search, any_airport=True),
+        "not an object",
+    ]).get_json()["results"]
+
+    assert results[0]["success"]
+    assert [(result["success"], result["status"]) for result in results[1:]] == [(False, 400)] * 3
+    assert "any_airport" in results[2]["error"]
+
+
+def test_upstream_failure_is_reported_per_item(client, provider):
+    provider.error_rate = 1.0
+    result = batch(client, [dict(SEARCH, outbound_date=future(30))]).get_json()["results"][0]
+    assert result["success"] is False and result["status"] == 502
+
+
+def test_batch_searches_count_towards_popularity(client, monkeypatch):
+    refresher = RecordingRefresher()
+    monkeypatch.setattr(search, "_refresher", refresher)
+    item = dict(SEARCH, outbound_date=future(30))
+    batch(client, [item, item, dict(item, departure_id="ZZZ")])
+    assert [params["departure_id"] for params in refresher.recorded] == ["JFK", "JFK"]
+
+
+def test_malformed_requests_are_rejected(client):
+    assert batch(client, []).status_code == 400
+    response = client.post("/search-flights/batch", data="{not json", content_type="application/json")
+    assert response.status_code == 400
+    assert client.post("/search-flights/batch", data="x", content_type="text/plain").status_code == 415
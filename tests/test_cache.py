@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from backend import search
+from backend.cache import FlightCache
+from backend.providers import UpstreamRejected
+from conftest import search_params
+
+
+def test_concurrent_misses_make_one_upstream_call(provider):
+    provider.latency = 0.2
+    params = search_params()
+    before = search.flight_cache.stats()
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(search.cached_search_flights(params)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = search.flight_cache.stats()
+    assert provider.calls == 1
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["coalesced"] - before["coalesced"] == 7
+    assert all(result is results[0] for result in results) and results[0]
+
+
+def test_expired_entry_is_reloaded():
+    cache = FlightCache(ttl=0.05)
+    assert cache.get_or_load("k", lambda: 1) == 1
+    assert cache.get_or_load("k", lambda: 2) == 1
+    time.sleep(0.06)
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: 3) == 3
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = FlightCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_loader_error_reaches_waiters_and_is_not_cached():
+    cache = FlightCache()
+    started = threading.Event()
+    errors = []
+
+    def failing_loader():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    def waiter():
+        started.wait()
+        try:
+            cache.get_or_load("k", lambda: "unused")
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("k", failing_loader)
+    thread.join()
+
+    assert len(errors) == 1
+    assert cache.get("k") is None
+
+
+def test_refresh_negatively_caches_empty_results(provider, monkeypatch):
+    monkeypatch.setattr(search, "_refresh_provider", provider)
+    provider.responses = [{}]
+    params = search_params()
+    key = search.cache_key(params)
+
+    assert search.refresh_search(params) == []
+    assert search.negative_cache.get(key) == ("empty", None)
+    assert search.flight_cache.get(key) is None
+
+    # Not retried until the negative entry expires
+    assert search.refresh_search(params) == []
+    assert provider.calls == 1
+
+
+def test_empty_result_is_negatively_cached(provider):
+    provider.responses = [{}]
+    params = search_params()
+
+    assert search.cached_search_flights(params) == []
+    assert search.cached_search_flights(params) == []
+    assert provider.calls == 1
+    assert search.flight_cache.get(search.cache_key(params)) is None
+
+
+def test_no_results_error_is_an_empty_result(provider):
+    provider.responses = [{"error": "Google Flights hasn't returned any results for this query."}]
+    params = search_params()
+
+    assert search.cached_search_flights(params) == []
+    assert search.negative_cache.get(search.cache_key(params)) == ("empty", None)
+
+
+def test_negatively_cached_error_keeps_its_type(provider, client):
+    provider.responses = [{"error": "Invalid API key."}]
+    params = search_params()
+
+    for _ in range(2):
+        with pytest.raises(UpstreamRejected, match="Invalid API key"):
+            search.cached_search_flights(params)
+    assert provider.calls == 1
+
+    # Repeats are still reported as upstream failures, not server errors
+    response = client.post("/search-flights", json={
+        "departure_id": "JFK", "arrival_id": "LAX", "type": 2, "outbound_date": params["outbound_date"],
+    })
+    assert response.status_code == 502
+    assert provider.calls == 1
@@ -0,0 +1,70 @@
+import copy
+
+import pytest
+
+from backend import app as backend_app, search
+from backend.flight_api import _parse_results
+from backend.providers import ProviderError
+from conftest import RecordingRefresher, future, search_params
+
+
+class RecordingLog:
+    """Stands in for the RequestLog to capture logged searches"""
+
+    def __init__(self):
+        self.logged = []
+
+    def log(self, params, flights=None):
+        self.logged.append((params, flights))
+
+
+def test_routes_are_merged_without_duplicates(provider):
+    recorded = provider.responses[0]
+    cheaper = copy.deepcopy(recorded)
+    cheaper["best_flights"][0]["price"] -= 50
+    extra = copy.deepcopy(cheaper["best_flights"][0])
+    extra["flights"][0]["flight_number"] = "XX 1"
+    cheaper["other_flights"].append(extra)
+    provider.responses = [recorded, cheaper]
+
+    flights, routes = search.search_metro(search_params(), ["JFK", "EWR"], ["LAX"])
+    assert provider.calls == 2
+    assert [(route["departure_id"], route["arrival_id"]) for route in routes] == [("JFK", "LAX"), ("EWR", "LAX")]
+
+    both = _parse_results(recorded) + _parse_results(cheaper)
+    keys = {search._itinerary_key(flight) for flight in both}
+    assert len(flights) == len(keys) == len(_parse_results(recorded)) + 1
+    assert [search._price(flight) for flight in flights] == sorted(search._price(flight) for flight in flights)
+
+    # The cheaper copy of an itinerary found on both routes is kept
+    merged = {search._itinerary_key(flight): flight["price"] for flight in flights}
+    assert merged[search._itinerary_key(_parse_results(cheaper)[0])] == recorded["best_flights"][0]["price"] - 50
+
+
+def test_same_airport_routes_are_skipped(provider):
+    _, routes = search.search_metro(search_params(), ["JFK", "EWR"], ["EWR"])
+    assert routes == [{"departure_id": "JFK", "arrival_id": "EWR", "count": routes[0]["count"]}]
+    with pytest.raises(ValueError):
+        search.search_metro(search_params(), ["EWR"], ["EWR"])
+
+
+def test_failure_of_every_route_is_raised(provider):
+    provider.error_rate = 1.0
+    with pytest.raises(ProviderError):
+        search.search_metro(search_params(), ["JFK", "EWR"], ["LAX"])
+
+
+def test_each_metro_route_is_recorded_and_logged(client, monkeypatch):
+    refresher, request_log = RecordingRefresher(), RecordingLog()
+    monkeypatch.setattr(search, "_refresher", refresher)
+    monkeypatch.setattr(backend_app, "request_log", request_log)
+
+    response = client.post("/search-flights", json={
+        "departure_id": "NYC", "arrival_id": "LAX", "type": 2,
+        "outbound_date": future(30), "any_airport": "departure",
+    })
+    assert response.status_code == 200
+    routes = {(route["departure_id"], route["arrival_id"]) for route in response.get_json()["routes"]}
+    assert len(routes) > 1
+    assert {(params["departure_id"], params["arrival_id"]) for params in refresher.recorded} == routes
+    assert {(params["departure_id"], params["arrival_id"]) for params, _ in request_log.logged} == routes
@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import pairing
+from backend.pairing import parse_pairing_options, rank_pairs
+
+
+def flight(price, departs, hours=5, stops=0, emissions=None):
+    """Flight departing `departs` hours after a fixed start, as normalized by flight_api"""
+    start = datetime(2030, 1, 1) + timedelta(hours=departs)
+    return {
+        "price": price,
+        "total_duration": hours * 60,
+        "stops": stops,
+        "carbon_emissions": {"this_flight": emissions} if emissions is not None else None,
+        "all_flights": [{
+            "departure_airport": {"id": "JFK", "time": start.strftime("%Y-%m-%d %H:%M")},
+            "arrival_airport": {"id": "LAX", "time": (start + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M")},
+        }],
+    }
+
+
+def test_pairs_are_ranked_by_weighted_score():
+    outbound = [flight(300, 0), flight(200, 0, stops=3), flight(250, 0)]
+    inbound = [flight(100, 48), flight(150, 48), flight(50, 2)]
+    pairs = rank_pairs(outbound, inbound, parse_pairing_options({"limit": 3}))
+
+    # The cheap return leaves before the outbound flight lands; three stops
+    # cost 50 in the default weights
+    assert [(pair["outbound_index"], pair["return_index"]) for pair in pairs] == [(2, 0), (1, 0), (2, 1)]
+    assert pairs[0]["total_price"] == 350 and pairs[0]["stay_minutes"] == 43 * 60
+    assert pairs == sorted(pairs, key=lambda pair: pair["score"])
+
+
+def test_constraints_and_weights():
+    outbound = [flight(300, 0), flight(200, 0, stops=2)]
+    inbound = [flight(100, 10), flight(100, 100)]
+
+    options = parse_pairing_options({"weights": {"stops": 0}, "max_stay_hours": 24, "max_total_stops": 1})
+    pairs = rank_pairs(outbound, inbound, options)
+    assert [(pair["outbound_index"], pair["return_index"]) for pair in pairs] == [(0, 0)]
+
+    options = parse_pairing_options({"weights": {"stops": 0}, "min_stay_hours": 24})
+    assert [pair["return_index"] for pair in rank_pairs(outbound, inbound, options)] == [1, 1]
+
+
+@pytest.mark.parametrize("data, field", [
+    ({"weights": {"price": [1]}}, "weights.price"),
+    ({"weights": {"speed": 1}}, "weights"),
+    ({"weights": [1]}, "weights"),
+    ({"limit": [3]}, "limit"),
+    ({"limit": 1e400}, "limit"),
+    ({"min_stay_hours": {}}, "min_stay_hours"),
+    ({"max_total_price": "cheap"}, "max_total_price"),
+])
+def test_malformed_options_name_the_field(data, field):
+    with pytest.raises(ValueError, match=field):
+        parse_pairing_options(data)
+
+
+@pytest.mark.parametrize("change, field", [
+    ({"price": {}}, "outbound[0].price"),
+    ({"carbon_emissions": 5}, "outbound[0].carbon_emissions"),
+    ({"all_flights": [1]}, "outbound[0].all_flights"),
+    ({"all_flights": [{"departure_airport": {"time": 5}}]}, "outbound[0].departure_airport"),
+    ({"stops": "two"}, "outbound[0].stops"),
+])
+def test_malformed_flights_name_the_field(change, field):
+    with pytest.raises(ValueError, match=field.replace("[", r"\[").replace("]", r"\]")):
+        rank_pairs([dict(flight(100, 0), **change)], [flight(100, 48)], parse_pairing_options({}))
+
+
+def test_pairs_endpoint_rejects_malformed_flights(client):
+    response = client.post("/search-roundtrip/pairs", json={
+        "outbound": [dict(flight(100, 0), price={})],
+        "return": [flight(100, 48)],
+    })
+    assert response.status_code == 400
+    assert "outbound[0].price" in response.get_json()["error"]
+
+
+@pytest.mark.skipif(pairing.np is None, reason="numpy is not installed")
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_and_python_rankings_agree(seed):
+    rng = random.Random(seed)
+
+    def random_flights(count, after):
+        flights = [
+            flight(rng.choice([None, rng.randrange(50, 900)]) if rng.random() < 0.1 else rng.randrange(50, 900),
+                   after + rng.randrange(0, 96), hours=rng.randrange(1, 15), stops=rng.randrange(0, 3),
+                   emissions=rng.choice([None, rng.randrange(50000, 900000)]))
+            for _ in range(count)
+        ]
+        # Identical flights give tied scores
+        return flights + flights[:5]
+
+    out_rows = pairing._features(random_flights(60, 0), "outbound")
+    ret_rows = pairing._features(random_flights(60, 72), "return")
+    options = parse_pairing_options({
+        "weights": {"emissions": 0.5}, "min_stay_hours": 12, "max_stay_hours": 120,
+        "max_total_price": 1200, "max_total_stops": 3, "limit": 100,
+    })
+    expected = pairing._rank_python(out_rows, ret_rows, options, options["limit"])
+    assert expected
+    assert pairing._rank_numpy(out_rows, ret_rows, options, options["limit"]) == expected
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from backend import search
+from backend.providers import ProviderError, SerpApiProvider, UpstreamRejected, UpstreamUnavailable
+from backend.ratelimit import TokenBucket
+from backend.resilience import CircuitBreaker, ResilientProvider
+from conftest import CountingReplay, future, search_params
+
+
+class FakeResponse:
+    """Minimal requests.Response stand-in for SerpApiProvider"""
+
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.content = b"{}"
+
+    def json(self):
+        return self.body
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    replay = CountingReplay(error_rate=1.0)
+    resilient = ResilientProvider(replay, qps=0, retries=0, failure_threshold=2, reset_timeout=0.2)
+    try:
+        for _ in range(2):
+            with pytest.raises(ProviderError):
+                resilient.fetch({})
+        assert resilient.breaker.state == CircuitBreaker.OPEN
+
+        # Refused locally while open
+        with pytest.raises(UpstreamUnavailable):
+            resilient.fetch({})
+        assert replay.calls == 2
+
+        # After the reset timeout one trial call is let through
+        time.sleep(0.25)
+        replay.error_rate = 0.0
+        replay.latency = 0.2
+        trial = threading.Thread(target=resilient.fetch, args=({},))
+        trial.start()
+        time.sleep(0.05)
+        assert resilient.breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(UpstreamUnavailable):
+            resilient.fetch({})
+        trial.join()
+
+        assert resilient.breaker.state == CircuitBreaker.CLOSED
+        assert replay.calls == 3
+    finally:
+        resilient.close()
+
+
+def test_serpapi_error_body_is_rejected_and_counts_towards_the_breaker(monkeypatch):
+    serpapi = SerpApiProvider("key")
+    monkeypatch.setattr(serpapi.session, "get", lambda *args, **kwargs: FakeResponse({"error": "Invalid API key."}))
+    resilient = ResilientProvider(serpapi, qps=0, retries=2, failure_threshold=2)
+    try:
+        for _ in range(2):
+            with pytest.raises(UpstreamRejected, match="Invalid API key"):
+                resilient.fetch({})
+        assert resilient.breaker.state == CircuitBreaker.OPEN
+    finally:
+        resilient.close()
+
+
+def test_serpapi_no_results_body_is_not_an_error(monkeypatch):
+    body = {"error": "Google Flights hasn't returned any results for this query."}
+    serpapi = SerpApiProvider("key")
+    monkeypatch.setattr(serpapi.session, "get", lambda *args, **kwargs: FakeResponse(body))
+    try:
+        assert serpapi.fetch({}) == body
+    finally:
+        serpapi.close()
+
+
+def test_rejected_search_is_a_bad_gateway(client, provider):
+    provider.responses = [{"error": "Invalid API key."}]
+    response = client.post("/search-flights", json={
+        "departure_id": "JFK", "arrival_id": "LAX", "type": 2, "outbound_date": future(30),
+    })
+    assert response.status_code == 502
+    assert "Invalid API key" in response.get_json()["error"]
+
+
+def test_stale_result_served_on_provider_error(provider, monkeypatch):
+    # Entries expire as soon as they are stored but stay available as stale
+    monkeypatch.setattr(search.flight_cache, "ttl", 0)
+    params = search_params()
+
+    fresh = search.cached_search_flights(params)
+    assert fresh
+
+    provider.error_rate = 1.0
+    assert search.cached_search_flights(params) is fresh
+    assert provider.calls == 2
+
+
+def test_provider_error_without_stale_result_is_raised(provider):
+    provider.error_rate = 1.0
+    with pytest.raises(ProviderError):
+        search.cached_search_flights(search_params())
+
+
+def test_token_bucket_times_out_when_empty():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire(timeout=0)
+    started = time.monotonic()
+    assert not bucket.acquire(timeout=0.1)
+    assert time.monotonic() - started < 0.5
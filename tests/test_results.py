@@ -0,0 +1,46 @@
+import pytest
+
+from backend.flight_api import search_flights
+from backend.providers import ReplayProvider
+from backend.results import apply_result_query, parse_result_query
+from conftest import search_params
+
+
+@pytest.fixture(scope="module")
+def flights():
+    provider = ReplayProvider()
+    try:
+        return search_flights(provider=provider, **search_params())
+    finally:
+        provider.close()
+
+
+def test_cursor_rejects_changed_filters(flights):
+    query = parse_result_query({"sort": "price", "limit": 2})
+    page, total, cursor = apply_result_query(flights, query)
+    assert len(page) == 2 and total > 2 and cursor
+
+    next_page, _, _ = apply_result_query(flights, parse_result_query({"sort": "price", "limit": 2, "cursor": cursor}))
+    assert next_page[0] is not page[0]
+
+    with pytest.raises(ValueError):
+        parse_result_query({"sort": "price", "max_stops": 0, "limit": 2, "cursor": cursor})
+    with pytest.raises(ValueError):
+        parse_result_query({"sort": "-price", "limit": 2, "cursor": cursor})
+
+
+@pytest.mark.parametrize("field", ["max_stops", "max_price", "limit"])
+@pytest.mark.parametrize("value", [float("inf"), float("-inf"), float("nan"), "inf", "nan", [1], {}])
+def test_non_finite_numbers_are_rejected(field, value):
+    with pytest.raises(ValueError, match=field):
+        parse_result_query({field: value})
+
+
+def test_huge_number_in_request_is_a_bad_request(client):
+    response = client.post(
+        "/search-flights", data=f'{{"departure_id": "JFK", "arrival_id": "LAX", "type": 2, '
+        f'"outbound_date": "{search_params()["outbound_date"]}", "max_stops": 1e400}}',
+        content_type="application/json",
+    )
+    assert response.status_code == 400
+    assert "max_stops" in response.get_json()["error"]
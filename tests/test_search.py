@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from backend import search
+from conftest import future
+
+
+ROUTE = {"departure_id": "JFK", "arrival_id": "LAX"}
+
+
+def grid(**fields):
+    return search.normalize_date_grid_params(dict(ROUTE, **fields))[1]
+
+
+def test_date_grid_pairs_only_returns_on_or_after_outbound():
+    pairs = grid(outbound_date_from=future(1), outbound_date_to=future(5),
+                 return_date=future(4), return_flex_days=2)
+    assert len(pairs) == 19
+    assert all(ret >= outbound for outbound, ret in pairs)
+    assert len(grid(outbound_date_from=future(1), outbound_date_to=future(5))) == 5
+
+
+@pytest.mark.parametrize("fields", [
+    # Spans of thousands of years are rejected before any dates are listed
+    {"outbound_date_from": "0001-01-01", "outbound_date_to": "9999-12-31",
+     "return_date": "9999-12-31", "return_flex_days": 365},
+    {"outbound_date_from": future(1), "outbound_date_to": future(3),
+     "return_date": "9999-12-30", "return_flex_days": 5},
+    {"outbound_date_from": future(1), "outbound_date_to": future(3),
+     "return_date": "0001-01-02", "return_flex_days": 365},
+    {"outbound_date_from": future(1), "outbound_date_to": future(300),
+     "return_date": future(200), "return_flex_days": 30},
+    {"outbound_date_from": future(10), "outbound_date_to": future(12),
+     "return_date": future(5)},
+])
+def test_date_grid_rejects_unbounded_or_oversized_ranges(fields):
+    started = time.monotonic()
+    with pytest.raises(ValueError):
+        grid(**fields)
+    assert time.monotonic() - started < 0.5
+
+
+def test_date_grid_endpoint(client):
+    response = client.post("/search-flights/dates", json=dict(
+        ROUTE, outbound_date_from=future(10), outbound_date_to=future(11)))
+    assert response.status_code == 200
+
+    response = client.post("/search-flights/dates", json=dict(
+        ROUTE, outbound_date_from="0001-01-01", outbound_date_to="9999-12-31"))
+    assert response.status_code == 400
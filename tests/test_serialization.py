@@ -0,0 +1,81 @@
+import pytest
+
+from backend.flight_api import search_flights
+from backend.providers import ReplayProvider
+from backend.serialization import encode_compact, parse_fields, project
+from conftest import future, search_params
+
+
+@pytest.fixture(scope="module")
+def flights():
+    provider = ReplayProvider()
+    try:
+        return search_flights(provider=provider, **search_params())
+    finally:
+        provider.close()
+
+
+def decode_compact(payload):
+    """Expand a compact payload back into full flight records"""
+    def decode(record):
+        decoded = dict(record)
+        for field in ("departure_airport", "arrival_airport"):
+            if isinstance(record.get(field), dict):
+                airport = payload["airports"][record[field]["airport"]]
+                decoded[field] = dict(airport, time=record[field]["time"])
+        if record.get("airline") is not None:
+            decoded["airline"] = payload["airlines"][record["airline"]]
+        if record.get("airline_logo") is not None:
+            decoded["airline_logo"] = payload["logos"][record["airline_logo"]]
+        return decoded
+
+    flights = []
+    for record in payload["flights"]:
+        flight = decode(record)
+        if record.get("all_flights"):
+            flight["all_flights"] = [decode(leg) for leg in record["all_flights"]]
+        flights.append(flight)
+    return flights
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("price, airline,price") == (("price", "airline"), None)
+    assert parse_fields(["price", "all_flights.airline"]) == (("price", "all_flights"), ("airline",))
+    for fields in ("bogus", "price.amount", "all_flights.bogus", 5, ["price", 1]):
+        with pytest.raises(ValueError):
+            parse_fields(fields)
+
+
+def test_project_keeps_only_requested_fields(flights):
+    assert project(flights, None) is flights
+
+    projected = project(flights, parse_fields("price,all_flights.flight_number"))
+    assert projected[0] == {
+        "price": flights[0]["price"],
+        "all_flights": [{"flight_number": leg["flight_number"]} for leg in flights[0]["all_flights"]],
+    }
+    # The cached flights are not modified
+    assert "airline" in flights[0]
+
+
+def test_compact_encoding_round_trips(flights):
+    payload = encode_compact(flights)
+    # Airports in the recorded response hold only id, name and time
+    assert decode_compact(payload) == flights
+    assert len(payload["airlines"]) == len({flight["airline"] for flight in flights} |
+                                           {leg["airline"] for flight in flights for leg in flight["all_flights"]})
+
+
+def test_search_endpoint_projection_and_compact_format(client):
+    search = {"departure_id": "JFK", "arrival_id": "LAX", "type": 2, "outbound_date": future(30)}
+    full = client.post("/search-flights", json=search).get_json()
+
+    response = client.post("/search-flights", json=dict(search, fields="price,airline", format="compact"))
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload["format"] == "compact" and payload["total"] == full["total"]
+    assert decode_compact(payload) == project(full["flights"], parse_fields("price,airline"))
+
+    assert client.post("/search-flights", json=dict(search, format="xml")).status_code == 400
+    assert client.post("/search-flights", json=dict(search, fields="bogus")).status_code == 400
@@ -0,0 +1,50 @@
+import json
+
+from conftest import future
+
+
+SEARCH = {"departure_id": "JFK", "arrival_id": "LAX", "type": 2}
+
+
+def stream(client, payload, accept="application/x-ndjson"):
+    return client.post("/search-flights/stream", json=payload, headers={"Accept": accept})
+
+
+def test_ndjson_stream_of_one_search(client):
+    response = stream(client, dict(SEARCH, outbound_date=future(30), limit=3, fields="price"))
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    records = [json.loads(line) for line in response.data.splitlines()]
+    assert [record["type"] for record in records] == ["search", "flight", "flight", "flight", "done"]
+    assert records[0]["search"] == "outbound" and records[0]["count"] == 3
+    assert all(set(record["flight"]) == {"price"} for record in records[1:4])
+    assert records[-1] == {"type": "done", "count": 3, "searches": 1}
+
+
+def test_sse_stream_of_round_trip_legs(client):
+    payload = dict(SEARCH, type=1, outbound_date=future(30), return_date=future(37), split_legs=True, limit=1)
+    response = stream(client, payload, accept="text/event-stream")
+    assert response.mimetype == "text/event-stream"
+
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        event = json.loads(data_line[len("data: "):])
+        assert event_line == "event: " + event["type"]
+        events.append((event["type"], event.get("search")))
+    # Searches are streamed as they complete, each followed by its flights
+    assert events[-1] == ("done", None)
+    assert sorted(events[:-1:2]) == [("search", "outbound"), ("search", "return")]
+    assert all(flight == ("flight", search[1]) for search, flight in zip(events[:-1:2], events[1:-1:2]))
+
+
+def test_failed_search_is_streamed_as_an_error(client, provider):
+    provider.error_rate = 1.0
+    records = [json.loads(line) for line in stream(client, dict(SEARCH, outbound_date=future(30))).data.splitlines()]
+    assert [record["type"] for record in records] == ["error", "done"]
+
+
+def test_stream_rejects_cursors_and_bad_input(client):
+    assert stream(client, dict(SEARCH, outbound_date=future(30), cursor="abc")).status_code == 400
+    assert stream(client, dict(SEARCH, outbound_date="not-a-date")).status_code == 400
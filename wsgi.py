@@ -0,0 +1,17 @@
+"""
+Production entry point
+
+    gunicorn --preload -w 4 -b 0.0.0.0:5000 wsgi:app
+
+--preload builds the airport index, encoded payloads and provider once in
+the master process before the workers are forked.
+"""
+from dotenv import load_dotenv
+
+# Settings are read when the backend modules are imported, so .env is
+# loaded first
+load_dotenv()
+
+from backend.app import create_app  # noqa: E402
+
+app = create_app()